@@ -0,0 +1,94 @@
+"""
+Trades point reduction against rendered image fidelity for the voxel-grid decimation:
+every voxel size, reduction and LOD distance renders the same poses as the full sweep,
+and is reported with its kept points, time and pixel difference to the full render.
+
+    python -m benchmarks.bench_decimation --voxel-sizes 0.05 0.1 0.2 --lod-distances 0 20
+    python -m benchmarks.bench_decimation --kitti-path /data/kitti/training --frame 000042
+
+Without --kitti-path the sweep is a synthetic make_scan. The time covers decimating once
+and projecting and rendering every pose. The pixel columns compare against the full render:
+    changed   pixels whose color differs
+    coverage  IoU of the lit (non-black) pixels
+    mae       mean absolute RGB error over the pixels lit in either image
+"""
+import argparse
+import itertools
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import IMAGE_SHAPE, make_scan, write_calib
+from point_cloud_handlers.calibration import KITTICalibration
+from point_cloud_handlers.decimation import REDUCTIONS, VoxelDecimator
+from point_cloud_handlers.rasterizer import rasterize_points
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def pixel_difference(images, references):
+    """Returns (changed pixel fraction, lit pixel IoU, mean abs error over lit pixels) over all poses."""
+    changed = lit_both = lit_any = 0
+    error = 0.0
+    for image, reference in zip(images, references):
+        lit, lit_ref = image.any(axis=2), reference.any(axis=2)
+        changed += np.count_nonzero((image != reference).any(axis=2))
+        lit_both += np.count_nonzero(lit & lit_ref)
+        union = lit | lit_ref
+        lit_any += np.count_nonzero(union)
+        error += np.abs(image[union].astype(np.int16) - reference[union]).sum() / 3
+    pixels = sum(image.shape[0] * image.shape[1] for image in images)
+    return changed / pixels, lit_both / max(lit_any, 1), error / max(lit_any, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kitti-path", default=None, help="KITTI object root to read --frame from")
+    parser.add_argument("--frame", default="000000")
+    parser.add_argument("--points", type=int, default=120_000, help="synthetic sweep size")
+    parser.add_argument("--poses", type=int, default=3)
+    parser.add_argument("--voxel-sizes", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.4])
+    parser.add_argument("--reductions", nargs="+", default=list(REDUCTIONS), choices=REDUCTIONS)
+    parser.add_argument("--lod-distances", type=float, nargs="+", default=[0, 20], help="0 disables LOD")
+    parser.add_argument("--radius", type=int, default=0, help="rendered point radius in pixels")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.kitti_path:
+        from point_cloud_handlers.kitti_dataset import KITTIPaths
+
+        image_shape, lidar, calib, _ = KITTIPaths(args.kitti_path).load_frame(args.frame)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            calib = KITTICalibration(write_calib(Path(tmp) / "calib.txt"))
+        image_shape, lidar = IMAGE_SHAPE, make_scan(args.points)
+    extrinsics = np.stack([calib.get_camera_extrinsic(yaw=yaw) for yaw in np.linspace(-45, 45, args.poses)])
+
+    def render(decimator=None):
+        points = lidar if decimator is None else decimator(lidar)
+        visible = calib.project_visible_multi(points, extrinsics, image_shape)
+        return len(points), [rasterize_points(uv, depth, image_shape, radius=args.radius) for uv, depth, _ in visible]
+
+    t_full, (_, references) = _best_of(render, args.repeat)
+    print(f"points={len(lidar)} poses={args.poses} image={image_shape[:2]} full render: {t_full * 1e3:.1f} ms")
+    print(f"\n{'voxel':>7}{'reduce':>9}{'lod':>6}{'points':>9}{'kept':>8}{'time':>11}{'speedup':>9}"
+          f"{'changed':>9}{'coverage':>10}{'mae':>7}")
+    for voxel_size, reduce, lod in itertools.product(args.voxel_sizes, args.reductions, args.lod_distances):
+        decimator = VoxelDecimator(voxel_size, reduce=reduce, lod_distance=lod or None)
+        seconds, (kept, images) = _best_of(lambda: render(decimator), args.repeat)
+        changed, coverage, mae = pixel_difference(images, references)
+        print(f"{voxel_size:7.2f}{reduce:>9}{lod or '-':>6}{kept:9d}{kept / len(lidar):8.1%}{seconds * 1e3:8.1f} ms"
+              f"{t_full / seconds:8.2f}x{changed:9.2%}{coverage:10.3f}{mae:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Import time and memory of the point_cloud_handlers modules, each in a fresh interpreter,
+and a guard that the numeric core never loads the plotting or image I/O libraries.
+
+    python -m benchmarks.bench_import --output imports.json
+    python -m benchmarks.bench_import --compare imports.json --tolerance 0.25
+
+The time is the module's cumulative -X importtime, best of --repeat runs, with NumPy
+imported first so it is not counted. The run exits non-zero if a core module imports
+one of HEAVY_MODULES, or with --compare if a module got slower than the baseline by
+more than the tolerance (and by more than --slack-ms, which absorbs timer noise).
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+
+# Modules worker processes need, importable without any of HEAVY_MODULES
+CORE_MODULES = (
+    "point_cloud_handlers.base_kitti_handler",
+    "point_cloud_handlers.calibration",
+    "point_cloud_handlers.decimation",
+    "point_cloud_handlers.labels_handler",
+    "point_cloud_handlers.yolo_adapter",
+    "point_cloud_handlers.kitti_dataset",
+    "point_cloud_handlers.poses",
+    "point_cloud_handlers.visibility",
+)
+# Timed as well, allowed to import their optional dependencies
+OTHER_MODULES = (
+    "point_cloud_handlers.plot_utils",
+    "point_cloud_handlers.create_2d_ds",
+)
+HEAVY_MODULES = ("cv2", "matplotlib", "tqdm", "dotenv")
+
+_PROBE = """
+import json, resource, sys
+import numpy
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+import {module}
+print(json.dumps({{
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+    "rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base,
+}}))
+"""
+
+
+def probe(module):
+    """Imports module in a fresh interpreter. Returns (cumulative import us, probe result dict)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True)
+    cumulative = 0
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1])
+    return cumulative, json.loads(proc.stdout)
+
+
+def run(modules, repeat):
+    results = []
+    for module in modules:
+        best, info = float("inf"), None
+        for _ in range(repeat):
+            micros, info = probe(module)
+            best = min(best, micros)
+        result = {"module": module, "seconds": best / 1e6, "rss_mib": info["rss_kib"] / 1024, "heavy": info["heavy"]}
+        results.append(result)
+        heavy = ", ".join(info["heavy"]) or "-"
+        print(f"{module:<45}{best / 1e3:9.1f} ms{result['rss_mib']:8.1f} MiB   heavy: {heavy}")
+    return results
+
+
+def compare(results, baseline, tolerance, slack):
+    """Prints per-module import time ratios against a baseline run and returns the regressed modules."""
+    base = {r["module"]: r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'module':<45}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for result in results:
+        if result["module"] not in base:
+            continue
+        before, after = base[result["module"]]["seconds"], result["seconds"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance and after - before > slack:
+            regressions.append(result["module"])
+            flag = "  REGRESSION"
+        print(f"{result['module']:<45}{before * 1e3:10.1f}ms{after * 1e3:10.1f}ms{ratio:8.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio before flagging")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="slowdowns below this are never flagged")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module, the best is kept")
+    args = parser.parse_args()
+
+    results = run(CORE_MODULES + OTHER_MODULES, args.repeat)
+    report = {
+        "meta": {"python": sys.version.split()[0], "platform": platform.platform()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    leaks = [r["module"] for r in results if r["module"] in CORE_MODULES and r["heavy"]]
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.slack_ms / 1e3)
+
+    if leaks:
+        print(f"\n{len(leaks)} core modules import {'/'.join(HEAVY_MODULES)}: {', '.join(leaks)}")
+    if regressions:
+        print(f"\n{len(regressions)} import time regressions beyond {args.tolerance:.0%}")
+    if leaks or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compares the fused single-matrix projection, the batched multi-pose
+projection, the frustum-culled projection and the spatially indexed
+projection against the reference rotate_camera_and_project path.
+
+    python -m benchmarks.bench_projection --points 120000 --poses 3
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import IMAGE_SHAPE, make_lidar, write_calib
+from point_cloud_handlers.calibration import KITTICalibration
+from point_cloud_handlers.spatial_index import AzimuthIndex
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=120_000)
+    parser.add_argument("--poses", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        calib = KITTICalibration(write_calib(Path(tmp) / "calib.txt"))
+    lidar = make_lidar(args.points)
+    yaws = np.linspace(-45, 45, args.poses)
+
+    def reference():
+        for yaw in yaws:
+            R = calib.get_camera_extrinsic(yaw=yaw)
+            calib.rotate_camera_and_project(lidar, R)
+
+    def fused():
+        for yaw in yaws:
+            calib.project_lidar_pose(lidar, yaw=yaw)
+
+    extrinsics = np.stack([calib.get_camera_extrinsic(yaw=yaw) for yaw in yaws])
+
+    def batched():
+        calib.project_points_multi(lidar, extrinsics, chunk_size=args.chunk_size)
+
+    def culled():
+        calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE)
+
+    index = AzimuthIndex(lidar, calib)
+
+    def build_index():
+        AzimuthIndex(lidar, calib)
+
+    def indexed():
+        calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE, index=index)
+
+    # Equivalence check before timing
+    multi_pts, multi_depth = calib.project_points_multi(lidar, extrinsics, chunk_size=args.chunk_size)
+    for yaw in yaws:
+        ref_pts, ref_depth = calib.rotate_camera_and_project(lidar, calib.get_camera_extrinsic(yaw=yaw))
+        new_pts, new_depth = calib.project_lidar_pose(lidar, yaw=yaw)
+        visible = ref_depth > 1.0
+        np.testing.assert_allclose(new_pts[visible], ref_pts[visible], rtol=1e-4, atol=1e-2)
+        np.testing.assert_allclose(new_depth, ref_depth, rtol=1e-4, atol=1e-3)
+    for k, yaw in enumerate(yaws):
+        new_pts, new_depth = calib.project_lidar_pose(lidar, yaw=yaw)
+        np.testing.assert_allclose(multi_pts[k], new_pts, rtol=1e-5, atol=1e-3)
+        np.testing.assert_allclose(multi_depth[k], new_depth, rtol=1e-5, atol=1e-4)
+    for k, (vis_pts, vis_depth, idx) in enumerate(calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE)):
+        np.testing.assert_allclose(vis_pts, multi_pts[k][idx], rtol=1e-5, atol=1e-3)
+        np.testing.assert_allclose(vis_depth, multi_depth[k][idx], rtol=1e-5, atol=1e-4)
+    for (_, _, idx), (_, _, idx_indexed) in zip(
+        calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE),
+        calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE, index=index),
+    ):
+        np.testing.assert_array_equal(idx, np.sort(idx_indexed))
+
+    t_ref = _best_of(reference, args.repeat)
+    t_fused = _best_of(fused, args.repeat)
+    t_batched = _best_of(batched, args.repeat)
+    t_culled = _best_of(culled, args.repeat)
+    t_indexed = _best_of(indexed, args.repeat)
+    t_index = _best_of(build_index, args.repeat)
+    print(f"points={args.points} poses={args.poses}")
+    print(f"reference: {t_ref * 1e3:8.2f} ms")
+    print(f"fused:     {t_fused * 1e3:8.2f} ms")
+    print(f"batched:   {t_batched * 1e3:8.2f} ms")
+    print(f"culled:    {t_culled * 1e3:8.2f} ms")
+    print(f"indexed:   {t_indexed * 1e3:8.2f} ms (+ {t_index * 1e3:.2f} ms index build, once per frame)")
+    print(f"speedup:   {t_ref / t_fused:8.2f}x fused, {t_ref / t_batched:8.2f}x batched, "
+          f"{t_ref / t_culled:8.2f}x culled, {t_ref / t_indexed:8.2f}x indexed")
+
+
+if __name__ == "__main__":
+    main()
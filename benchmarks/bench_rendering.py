@@ -0,0 +1,69 @@
+"""
+Compares rendering one projected frame with the matplotlib scatter + savefig
+path against the NumPy rasterizer + cv2.imwrite path.
+
+    python -m benchmarks.bench_rendering --points 120000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import IMAGE_SHAPE, make_lidar, write_calib
+from point_cloud_handlers.calibration import KITTICalibration
+from point_cloud_handlers.rasterizer import rasterize_points
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=120_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from point_cloud_handlers.plot_utils import draw_points_on_plot
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        calib = KITTICalibration(write_calib(tmp / "calib.txt"))
+        img_pts, depth = calib.project_lidar_pose(make_lidar(args.points))
+
+        def matplotlib_path():
+            fig, ax = plt.subplots()
+            ax.imshow(np.zeros(IMAGE_SHAPE[:2], dtype=np.uint8), cmap='gray')
+            draw_points_on_plot(ax, img_pts, depth, IMAGE_SHAPE)
+            ax.axis("off")
+            fig.savefig(tmp / "matplotlib.png", bbox_inches='tight', pad_inches=0)
+            plt.close(fig)
+
+        def rasterizer_path():
+            canvas = rasterize_points(img_pts, depth, IMAGE_SHAPE)
+            cv2.imwrite(str(tmp / "raster.png"), cv2.cvtColor(canvas, cv2.COLOR_RGB2BGR))
+
+        t_mpl = _best_of(matplotlib_path, args.repeat)
+        t_raster = _best_of(rasterizer_path, args.repeat)
+        mpl_shape = cv2.imread(str(tmp / "matplotlib.png")).shape
+        raster_shape = cv2.imread(str(tmp / "raster.png")).shape
+
+    print(f"points={args.points} source shape={IMAGE_SHAPE}")
+    print(f"matplotlib: {t_mpl * 1e3:8.2f} ms  output shape={mpl_shape}")
+    print(f"rasterizer: {t_raster * 1e3:8.2f} ms  output shape={raster_shape}")
+    print(f"speedup:    {t_mpl / t_raster:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
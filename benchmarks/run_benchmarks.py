@@ -0,0 +1,471 @@
+"""
+Benchmark suite for the projection, label and dataset generation hot paths,
+on synthetic KITTI-shaped data.
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --output new.json --compare results.json --tolerance 0.15
+
+Every case is swept over point, object and pose counts and reports the best
+wall time, throughput and peak traced memory. Before timing, the optimized
+paths are checked numerically against the reference implementations.
+With --compare the run exits non-zero if any case got slower than the
+baseline by more than the tolerance.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import IMAGE_SHAPE, make_label_text, make_lidar, make_scan, write_calib, write_kitti_frames
+from point_cloud_handlers.calibration import KITTICalibration
+from point_cloud_handlers.decimation import VoxelDecimator
+from point_cloud_handlers.labels_handler import LABEL_DTYPE, KITTILabelHandler
+from point_cloud_handlers.spatial_index import AzimuthIndex
+from point_cloud_handlers.visibility import VisibilityFilter, points_in_boxes
+from point_cloud_handlers.yolo_adapter import rects_to_yolo, save_yolo_label
+
+FULL_SWEEP = {"points": [30_000, 120_000], "objects": [5, 30], "poses": [3, 20]}
+QUICK_SWEEP = {"points": [30_000], "objects": [10], "poses": [3]}
+
+
+class Fixture:
+    """Synthetic inputs shared by the cases, created once per run in a temporary directory."""
+    def __init__(self, tmp: Path):
+        self.tmp = tmp
+        self.calib = KITTICalibration(write_calib(tmp / "calib.txt"))
+        self._lidar = {}
+        self._scans = {}
+        self._labels = {}
+        self._frames = {}
+
+    def lidar(self, points):
+        if points not in self._lidar:
+            self._lidar[points] = make_lidar(points)
+        return self._lidar[points]
+
+    def scan(self, points):
+        if points not in self._scans:
+            self._scans[points] = make_scan(points)
+        return self._scans[points]
+
+    def labels(self, objects):
+        if objects not in self._labels:
+            path = self.tmp / f"label_{objects}.txt"
+            path.write_text(make_label_text(objects))
+            self._labels[objects] = KITTILabelHandler(path)
+        return self._labels[objects]
+
+    def extrinsics(self, poses):
+        return np.stack([self.calib.get_camera_extrinsic(yaw=yaw) for yaw in np.linspace(-45, 45, poses)])
+
+    def frames(self, points, objects):
+        key = (points, objects)
+        if key not in self._frames:
+            root = self.tmp / f"kitti_{points}_{objects}"
+            self._frames[key] = write_kitti_frames(root, num_frames=1, num_points=points, num_objects=objects)
+        return self._frames[key]
+
+
+# Each case takes (fixture, points, objects, poses) and returns (fn, items, unit),
+# with `items` processed per call of fn. Params a case ignores are not swept for it.
+def case_project_lidar_to_image(fx, points, objects, poses):
+    lidar = fx.lidar(points)
+    return (lambda: fx.calib.project_lidar_to_image(lidar)), points, "points"
+
+def case_rotate_camera_and_project(fx, points, objects, poses):
+    lidar, extrinsics = fx.lidar(points), fx.extrinsics(poses)
+    def fn():
+        for R in extrinsics:
+            fx.calib.rotate_camera_and_project(lidar, R)
+    return fn, points * poses, "points"
+
+def case_project_points_fused(fx, points, objects, poses):
+    lidar, extrinsics = fx.lidar(points), fx.extrinsics(poses)
+    def fn():
+        for R in extrinsics:
+            fx.calib.project_points(lidar, fx.calib.get_projection(R))
+    return fn, points * poses, "points"
+
+def case_project_points_multi(fx, points, objects, poses):
+    lidar, extrinsics = fx.lidar(points), fx.extrinsics(poses)
+    return (lambda: fx.calib.project_points_multi(lidar, extrinsics)), points * poses, "points"
+
+def case_project_visible_multi(fx, points, objects, poses):
+    lidar, extrinsics = fx.lidar(points), fx.extrinsics(poses)
+    return (lambda: fx.calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE)), points * poses, "points"
+
+def case_project_visible_indexed(fx, points, objects, poses):
+    lidar, extrinsics = fx.lidar(points), fx.extrinsics(poses)
+    index = AzimuthIndex(lidar, fx.calib)
+    return (lambda: fx.calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE, index=index)), points * poses, "points"
+
+def case_azimuth_index(fx, points, objects, poses):
+    lidar = fx.lidar(points)
+    return (lambda: AzimuthIndex(lidar, fx.calib)), points, "points"
+
+def case_project_visible_cameras(fx, points, objects, poses):
+    lidar, extrinsics = fx.lidar(points), fx.extrinsics(poses)
+    cameras = ("P0", "P1", "P2", "P3")
+    def fn():
+        fx.calib.project_visible_cameras(lidar, extrinsics, IMAGE_SHAPE, cameras)
+    return fn, points * poses * len(cameras), "points"
+
+def case_compute_box_3d(fx, points, objects, poses):
+    handler = fx.labels(objects)
+    labels = handler.labels
+    def fn():
+        for label in labels:
+            handler.compute_box_3d(label)
+    return fn, objects, "boxes"
+
+def case_compute_boxes_3d(fx, points, objects, poses):
+    handler = fx.labels(objects)
+    return handler.compute_boxes_3d, objects, "boxes"
+
+def case_get_2d_boxes_rotated(fx, points, objects, poses):
+    handler, extrinsics = fx.labels(objects), fx.extrinsics(poses)
+    def fn():
+        for R in extrinsics:
+            handler.get_2d_boxes_rotated(fx.calib, R)
+    return fn, objects * poses, "boxes"
+
+def case_get_2d_rects_multi(fx, points, objects, poses):
+    handler, extrinsics = fx.labels(objects), fx.extrinsics(poses)
+    return (lambda: handler.get_2d_rects(fx.calib, extrinsics)), objects * poses, "boxes"
+
+def case_points_in_boxes(fx, points, objects, poses):
+    lidar, handler = fx.lidar(points), fx.labels(objects)
+    return (lambda: points_in_boxes(lidar, fx.calib, handler.objects)), points, "points"
+
+def case_visibility_filter(fx, points, objects, poses):
+    lidar, handler, extrinsics = fx.lidar(points), fx.labels(objects), fx.extrinsics(poses)
+    visibility = VisibilityFilter()
+    box_ids = visibility.box_ids(lidar, fx.calib, handler.objects)
+    visible = fx.calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE)
+    rects, behind, near = handler.get_2d_rects(fx.calib, extrinsics, with_depth=True)
+    def fn():
+        for k in range(poses):
+            visibility.filter(rects[k], behind[k], near[k], box_ids, visible[k], IMAGE_SHAPE)
+    return fn, objects * poses, "boxes"
+
+def case_voxel_decimation(fx, points, objects, poses, reduce="mean"):
+    scan = fx.scan(points)
+    return partial(VoxelDecimator(0.1, reduce=reduce, lod_distance=20), scan), points, "points"
+
+def case_yolo_labels(fx, points, objects, poses):
+    handler = fx.labels(objects)
+    types, rects = handler.get_2d_boxes_rotated(fx.calib, fx.calib.get_camera_extrinsic())
+    output = fx.tmp / "yolo.txt"
+    def fn():
+        save_yolo_label(output=output, yolo_lines=rects_to_yolo(rects, IMAGE_SHAPE, class_names=types))
+    return fn, max(len(rects), 1), "boxes"
+
+def case_create_file_variants(fx, points, objects, poses):
+    from point_cloud_handlers.create_2d_ds import create_file_variants
+    from point_cloud_handlers.kitti_dataset import KITTIPaths
+
+    source = KITTIPaths(fx.frames(points, objects))
+    pose_list = [(yaw, 0, 0, 0, 0, 0) for yaw in np.linspace(-45, 45, poses)]
+    output_dir = fx.tmp / "datasets"
+    for i in range(poses):
+        (output_dir / f"dataset_{i}" / "images").mkdir(parents=True, exist_ok=True)
+        (output_dir / f"dataset_{i}" / "labels").mkdir(parents=True, exist_ok=True)
+    return (lambda: create_file_variants("000000", source, pose_list, output_dir=output_dir)), poses, "images"
+
+
+# name -> (case, swept parameters)
+CASES = {
+    "calibration.project_lidar_to_image": (case_project_lidar_to_image, ("points",)),
+    "calibration.rotate_camera_and_project": (case_rotate_camera_and_project, ("points", "poses")),
+    "calibration.project_points": (case_project_points_fused, ("points", "poses")),
+    "calibration.project_points_multi": (case_project_points_multi, ("points", "poses")),
+    "calibration.project_visible_multi": (case_project_visible_multi, ("points", "poses")),
+    "calibration.project_visible_multi[index]": (case_project_visible_indexed, ("points", "poses")),
+    "spatial_index.AzimuthIndex": (case_azimuth_index, ("points",)),
+    "calibration.project_visible_cameras[P0-P3]": (case_project_visible_cameras, ("points", "poses")),
+    "labels.compute_box_3d": (case_compute_box_3d, ("objects",)),
+    "labels.compute_boxes_3d": (case_compute_boxes_3d, ("objects",)),
+    "labels.get_2d_boxes_rotated": (case_get_2d_boxes_rotated, ("objects", "poses")),
+    "labels.get_2d_rects[multi]": (case_get_2d_rects_multi, ("objects", "poses")),
+    "visibility.points_in_boxes": (case_points_in_boxes, ("points", "objects")),
+    "visibility.filter": (case_visibility_filter, ("points", "objects", "poses")),
+    "decimation.voxel[mean]": (case_voxel_decimation, ("points",)),
+    "decimation.voxel[nearest]": (partial(case_voxel_decimation, reduce="nearest"), ("points",)),
+    "yolo.rects_to_yolo+save_yolo_label": (case_yolo_labels, ("objects",)),
+    "create_2d_ds.create_file_variants": (case_create_file_variants, ("points", "objects", "poses")),
+}
+
+
+def _time(fn, repeat):
+    fn()  # warm-up, fills caches
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def result_key(result):
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def run_cases(fx, sweep, repeat, selected=None):
+    results = []
+    for name, (case, swept) in CASES.items():
+        if selected and not any(s in name for s in selected):
+            continue
+        for values in itertools.product(*(sweep[p] for p in swept)):
+            params = dict(zip(swept, values))
+            args = {p: sweep[p][0] for p in ("points", "objects", "poses")}
+            args.update(params)
+            fn, items, unit = case(fx, **args)
+            seconds = _time(fn, repeat)
+            result = {
+                "name": name,
+                "params": params,
+                "seconds": seconds,
+                "throughput": items / seconds,
+                "unit": f"{unit}/s",
+                "peak_bytes": _peak_memory(fn),
+            }
+            results.append(result)
+            print(f"{result_key(result):<70}{seconds * 1e3:10.3f} ms{result['throughput']:14.4g} {result['unit']:<9}"
+                  f"{result['peak_bytes'] / 2 ** 20:9.1f} MiB")
+    return results
+
+
+def check_equivalence(fx, points=30_000, objects=20, poses=5):
+    """
+    Validates the optimized paths against the reference implementations.
+    Returns a list of (check name, passed, max abs error).
+    """
+    calib, lidar, extrinsics = fx.calib, fx.lidar(points), fx.extrinsics(poses)
+    handler = fx.labels(objects)
+    checks = []
+
+    def record(name, actual, expected, atol):
+        actual, expected = np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64)
+        err = float(np.max(np.abs(actual - expected))) if actual.size else 0.0
+        ok = actual.shape == expected.shape and err <= atol
+        checks.append((name, ok, err))
+
+    ref = [calib.rotate_camera_and_project(lidar, R) for R in extrinsics]
+    H, W = IMAGE_SHAPE[:2]
+    # Image coordinates are only compared where they get rendered: off-screen points near
+    # the camera plane amplify float32 roundoff through the divide
+    safe = [(d > 0) & (p[:, 0] >= 0) & (p[:, 1] >= 0) & (p[:, 0] < W) & (p[:, 1] < H) for p, d in ref]
+
+    fused = [calib.project_points(lidar, calib.get_projection(R)) for R in extrinsics]
+    record("project_points image", np.concatenate([p[m] for (p, _), m in zip(fused, safe)]),
+           np.concatenate([p[m] for (p, _), m in zip(ref, safe)]), atol=1e-2)
+    record("project_points depth", np.concatenate([d for _, d in fused]), np.concatenate([d for _, d in ref]), atol=1e-3)
+
+    multi_pts, multi_depth = calib.project_points_multi(lidar, extrinsics, chunk_size=7_000)
+    record("project_points_multi image", np.concatenate([p[m] for p, m in zip(multi_pts, safe)]),
+           np.concatenate([p[m] for (p, _), m in zip(ref, safe)]), atol=1e-2)
+    record("project_points_multi depth", multi_depth, np.stack([d for _, d in ref]), atol=1e-3)
+    # The chunks are pooled views, copied out before the next one overwrites them
+    chunks = [(start, stop, pts.copy(), depth.copy())
+              for start, stop, pts, depth in calib.iter_project_points_multi(lidar, extrinsics, chunk_size=7_000)]
+    record("iter_project_points_multi image", np.concatenate([pts for _, _, pts, _ in chunks], axis=1), multi_pts, atol=0)
+    record("iter_project_points_multi depth", np.concatenate([depth for *_, depth in chunks], axis=1), multi_depth, atol=0)
+
+    expected_visible = [np.flatnonzero(mask) for mask in safe]
+    index = AzimuthIndex(lidar, calib)
+    for label, kwargs in (("project_visible_multi", {}), ("project_visible_multi[index]", {"index": index})):
+        visible = calib.project_visible_multi(lidar, extrinsics, IMAGE_SHAPE, **kwargs)
+        mismatched = sum(
+            len(np.setxor1d(idx, expected)) for (_, _, idx), expected in zip(visible, expected_visible)
+        )
+        # Points on the image border may flip either way with float32 roundoff
+        checks.append((f"{label} visible set", mismatched <= poses, float(mismatched)))
+    cameras = calib.project_visible_cameras(lidar, extrinsics, IMAGE_SHAPE, ("P0", "P2"))
+    mismatched = sum(len(np.setxor1d(pose[1][2], expected)) for pose, expected in zip(cameras, expected_visible))
+    checks.append(("project_visible_cameras P2 visible set", mismatched <= poses, float(mismatched)))
+
+    ref_boxes = []
+    for R in extrinsics:
+        rects = []
+        for label in handler.labels:
+            pts_h, pts_2d = handler._project_box_to_image(handler.compute_box_3d(label), R, calib)
+            rects.append((*pts_2d.min(axis=0), *pts_2d.max(axis=0), np.all(pts_h[:, 2] <= 0)))
+        ref_boxes.append(rects)
+    ref_boxes = np.array(ref_boxes)
+    rects, behind = handler.get_2d_rects(calib, extrinsics)
+    record("get_2d_rects[multi] rects", rects, ref_boxes[..., :4], atol=1e-6)
+    record("get_2d_rects[multi] behind", behind, ref_boxes[..., 4], atol=0)
+    record("compute_boxes_3d", handler.compute_boxes_3d(),
+           np.array([handler.compute_box_3d(label) for label in handler.labels]), atol=1e-9)
+
+    # Per-box reference: every point in the box's own frame, last box first so the lowest index wins
+    cam = lidar[:, :3].astype(np.float64) @ calib.Tr_velo_to_cam[:3, :3].T + calib.Tr_velo_to_cam[:3, 3]
+    expected = np.full(len(lidar), -1)
+    for m in reversed(range(len(handler.objects))):
+        obj = handler.objects[m]
+        cos, sin = np.cos(obj['ry']), np.sin(obj['ry'])
+        local = (cam - [obj['x'], obj['y'], obj['z']]) @ np.array([[cos, 0, sin], [0, 1, 0], [-sin, 0, cos]])
+        inside = (np.abs(local[:, 0]) <= obj['l'] / 2) & (np.abs(local[:, 2]) <= obj['w'] / 2) & \
+            (local[:, 1] >= -obj['h']) & (local[:, 1] <= -0.1)
+        expected[inside] = m
+    mismatched = np.count_nonzero(points_in_boxes(lidar, calib, handler.objects) != expected)
+    # Points on a box face may flip either way with float32 roundoff
+    checks.append(("points_in_boxes", bool(mismatched <= 2), int(mismatched)))
+    checks.append(("VisibilityFilter hidden box", *check_hidden_box(calib)))
+    checks.append(("project_visible image bounds", *check_image_bounds(calib)))
+
+    # Voxel reference: one dict entry per voxel of a small scan
+    scan = fx.scan(points)[::10]
+    voxels = {}
+    for point in scan:
+        voxels.setdefault(tuple(np.floor(point[:3] / np.float32(0.25)).astype(int)), []).append(point)
+    means = sorted(np.mean(group, axis=0).tolist() for group in voxels.values())
+    nearest = sorted(min(group, key=lambda p: np.linalg.norm(p[:3])).tolist() for group in voxels.values())
+    record("voxel decimation mean", sorted(VoxelDecimator(0.25)(scan).tolist()), means, atol=1e-4)
+    record("voxel decimation nearest", sorted(VoxelDecimator(0.25, reduce="nearest")(scan).tolist()), nearest, atol=0)
+    return checks
+
+
+def check_image_bounds(calib, image_shape=(376, 1241, 3), samples=20_000):
+    """
+    Points back-projected onto the bottom and right image borders, at 2-80 m, where the float32
+    divide can round a point that passed u < W * w onto x == W. No projection may return one.
+    Returns (passed, number of points outside 0 <= x < W, 0 <= y < H).
+    """
+    H, W = image_shape[:2]
+    R = calib.get_camera_extrinsic()
+    t = np.linspace(0, 1, samples)
+    pixels = np.concatenate([np.stack([t * W, np.full(samples, H)]), np.stack([np.full(samples, W), t * H])], axis=1)
+    depth = np.random.default_rng(0).uniform(2, 80, 2 * samples)
+    fused = calib.get_projection(R, dtype=np.float64)
+    rect = np.vstack([pixels, np.ones(2 * samples)]) * depth
+    lidar = np.zeros((2 * samples, 4), dtype=np.float32)
+    lidar[:, :3] = np.linalg.solve(fused[:3, :3], rect - fused[:3, 3:]).T
+
+    results = [calib.project_visible_multi(lidar, R[None], image_shape)[0],
+               calib.project_visible_cameras(lidar, R[None], image_shape)[0][0],
+               calib.project_visible(lidar, fused.astype(np.float32), image_shape)]
+    outside = sum(int(np.count_nonzero((p[:, 0] >= W) | (p[:, 1] >= H) | (p < 0).any(axis=1))) for p, _, _ in results)
+    return outside == 0, outside
+
+
+def check_hidden_box(calib):
+    """
+    One box straight ahead at 10 m whose front face the lidar sees, a box of the same size at
+    20 m wholly behind it with no lidar points, and one off to the side with no points either.
+    The filter must drop only the hidden box. Returns (passed, number of wrong decisions).
+    """
+    objects = np.zeros(3, dtype=LABEL_DTYPE)
+    for field, values in (("h", 2.5), ("w", 1.8), ("l", 4.0), ("y", 1.7), ("x", [0, 0, 15]), ("z", [10, 20, 20])):
+        objects[field] = values
+    handler = KITTILabelHandler.from_array(objects)
+
+    # Front face of the first box, sampled every 5 cm in the camera frame, moved into velodyne
+    x, y = np.meshgrid(np.arange(-1.95, 2.0, 0.05), np.arange(-0.75, 1.55, 0.05))
+    cam = np.stack([x.ravel(), y.ravel(), np.full(x.size, 9.2), np.ones(x.size)])
+    lidar = np.zeros((x.size, 4), dtype=np.float32)
+    lidar[:, :3] = (np.linalg.inv(calib.Tr_velo_to_cam) @ cam)[:3].T
+
+    R = calib.get_camera_extrinsic()
+    visibility = VisibilityFilter()
+    rects, behind, near = handler.get_2d_rects(calib, R, with_depth=True)
+    visible = calib.project_visible_multi(lidar, R[None], IMAGE_SHAPE)[0]
+    _, keep, _ = visibility.filter(
+        rects, behind, near, visibility.box_ids(lidar, calib, objects), visible, IMAGE_SHAPE)
+    wrong = int(np.count_nonzero(keep != [True, False, True]))
+    return wrong == 0, wrong
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints per-case time ratios against a baseline run and returns the regressed keys.
+    """
+    base = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':<70}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for result in results:
+        key = result_key(result)
+        if key not in base:
+            continue
+        ratio = result["seconds"] / base[key]["seconds"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<70}{base[key]['seconds'] * 1e3:10.3f}ms{result['seconds'] * 1e3:10.3f}ms{ratio:8.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown ratio before flagging")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case, the best is kept")
+    parser.add_argument("--quick", action="store_true", help="single small configuration per case")
+    parser.add_argument("--cases", nargs="*", default=None, help="only run cases whose name contains one of these")
+    parser.add_argument("--skip-checks", action="store_true", help="skip the numerical equivalence checks")
+    args = parser.parse_args()
+
+    sweep = QUICK_SWEEP if args.quick else FULL_SWEEP
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            fx = Fixture(Path(tmp))
+            checks = [] if args.skip_checks else check_equivalence(fx)
+            for name, ok, err in checks:
+                print(f"{'ok  ' if ok else 'FAIL'} {name:<40} max error {err:.3g}")
+            results = run_cases(fx, sweep, args.repeat, args.cases)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "sweep": sweep,
+        },
+        "checks": [{"name": name, "passed": ok, "max_error": err} for name, ok, err in checks],
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = [name for name, ok, _ in checks if not ok]
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    if failed:
+        print(f"\n{len(failed)} equivalence checks failed: {', '.join(failed)}")
+    if regressions:
+        print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}")
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Synthetic KITTI-shaped inputs for the benchmarks, so no dataset download is needed.
+"""
+import numpy as np
+from pathlib import Path
+
+# Calibration of KITTI object frame 000000
+CALIB_TEXT = """P0: 7.215377e+02 0.000000e+00 6.095593e+02 0.000000e+00 0.000000e+00 7.215377e+02 1.728540e+02 0.000000e+00 0.000000e+00 0.000000e+00 1.000000e+00 0.000000e+00
+P1: 7.215377e+02 0.000000e+00 6.095593e+02 -3.875744e+02 0.000000e+00 7.215377e+02 1.728540e+02 0.000000e+00 0.000000e+00 0.000000e+00 1.000000e+00 0.000000e+00
+P2: 7.215377e+02 0.000000e+00 6.095593e+02 4.485728e+01 0.000000e+00 7.215377e+02 1.728540e+02 2.163791e-01 0.000000e+00 0.000000e+00 1.000000e+00 2.745884e-03
+P3: 7.215377e+02 0.000000e+00 6.095593e+02 -3.395242e+02 0.000000e+00 7.215377e+02 1.728540e+02 2.199936e+00 0.000000e+00 0.000000e+00 1.000000e+00 2.729905e-03
+R0_rect: 9.999239e-01 9.837760e-03 -7.445048e-03 -9.869795e-03 9.999421e-01 -4.278459e-03 7.402527e-03 4.351614e-03 9.999631e-01
+Tr_velo_to_cam: 7.533745e-03 -9.999714e-01 -6.166020e-04 -4.069766e-03 1.480249e-02 7.280733e-04 -9.998902e-01 -7.631618e-02 9.998621e-01 7.523790e-03 1.480755e-02 -2.717806e-01
+Tr_imu_to_velo: 9.999976e-01 7.553071e-04 -2.035826e-03 -8.086759e-01 -7.854027e-04 9.998898e-01 -1.482298e-02 3.195559e-01 2.024406e-03 1.482454e-02 9.998881e-01 -7.997231e-01
+"""
+
+IMAGE_SHAPE = (375, 1242, 3)
+
+
+def write_calib(path: Path) -> Path:
+    path.write_text(CALIB_TEXT)
+    return path
+
+
+def make_lidar(num_points: int, seed: int = 0) -> np.ndarray:
+    """
+    Returns a (N, 4) float32 cloud laid out like an HDL-64 sweep (x, y, z, reflectance).
+    """
+    rng = np.random.default_rng(seed)
+    azimuth = rng.uniform(-np.pi, np.pi, num_points)
+    elevation = rng.uniform(np.radians(-24.9), np.radians(2.0), num_points)
+    distance = rng.uniform(2.0, 80.0, num_points)
+    return np.stack([
+        distance * np.cos(elevation) * np.cos(azimuth),
+        distance * np.cos(elevation) * np.sin(azimuth),
+        distance * np.sin(elevation) + 1.73,
+        rng.uniform(0.0, 1.0, num_points),
+    ], axis=1).astype(np.float32)
+
+
+def make_scan(num_points: int, seed: int = 0, rings: int = 64) -> np.ndarray:
+    """
+    Returns a (N, 4) float32 cloud scanned like an HDL-64 sweep over flat ground: rings at fixed
+    elevations, evenly spaced in azimuth, the downward rays stopped by the road and the others by
+    walls up to 80 m away. Unlike make_lidar, the density falls off with range, as in KITTI.
+    """
+    rng = np.random.default_rng(seed)
+    elevation = np.repeat(np.radians(np.linspace(-24.9, 2.0, rings)), -(-num_points // rings))[:num_points]
+    azimuth = np.tile(np.linspace(-np.pi, np.pi, -(-num_points // rings), endpoint=False), rings)[:num_points]
+    wall = rng.uniform(10.0, 80.0, 360)[((azimuth + np.pi) / (2 * np.pi) * 360).astype(int) % 360]
+    with np.errstate(divide="ignore"):
+        ground = np.where(elevation < 0, 1.73 / np.sin(-elevation), np.inf)
+    distance = np.minimum(ground, wall / np.cos(elevation))
+    distance += rng.normal(0.0, 0.02, num_points)
+    return np.stack([
+        distance * np.cos(elevation) * np.cos(azimuth),
+        distance * np.cos(elevation) * np.sin(azimuth),
+        distance * np.sin(elevation),
+        rng.uniform(0.0, 1.0, num_points),
+    ], axis=1).astype(np.float32)
+
+
+_OBJECT_TYPES = ("Car", "Van", "Truck", "Pedestrian", "Cyclist", "Tram", "Misc", "DontCare")
+
+
+def make_label_text(num_objects: int, seed: int = 0) -> str:
+    """
+    KITTI label_2 text with num_objects boxes spread in front of the car, plus one DontCare line.
+    """
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(num_objects):
+        obj_type = _OBJECT_TYPES[i % (len(_OBJECT_TYPES) - 1)]
+        h, w, l = rng.uniform(1.4, 3.0), rng.uniform(0.6, 2.0), rng.uniform(0.8, 5.0)
+        x, z = rng.uniform(-15, 15), rng.uniform(4, 60)
+        ry = rng.uniform(-np.pi, np.pi)
+        lines.append(
+            f"{obj_type} 0.00 0 {ry:.2f} 100.00 150.00 200.00 250.00 "
+            f"{h:.2f} {w:.2f} {l:.2f} {x:.2f} 1.70 {z:.2f} {ry:.2f}"
+        )
+    lines.append("DontCare -1 -1 -10 500.00 170.00 590.00 190.00 -1 -1 -1 -1000 -1000 -1000 -10")
+    return "\n".join(lines) + "\n"
+
+
+def write_kitti_frames(root: Path, num_frames: int, num_points: int, num_objects: int) -> Path:
+    """
+    Writes a KITTI object-split layout (calib, velodyne, image_2, label_2) of synthetic frames.
+    """
+    import cv2
+
+    for name in ("calib", "velodyne", "image_2", "label_2"):
+        (root / name).mkdir(parents=True, exist_ok=True)
+    image = np.zeros(IMAGE_SHAPE, dtype=np.uint8)
+    for i in range(num_frames):
+        file = f"{i:06d}"
+        write_calib(root / "calib" / f"{file}.txt")
+        make_lidar(num_points, seed=i).tofile(root / "velodyne" / f"{file}.bin")
+        cv2.imwrite(str(root / "image_2" / f"{file}.png"), image)
+        (root / "label_2" / f"{file}.txt").write_text(make_label_text(num_objects, seed=i))
+    return root
@@ -1,36 +1,36 @@
 import numpy as np
-import cv2
-import matplotlib.pyplot as plt
 from pathlib import Path
 import os
-from dotenv import load_dotenv
 
 from point_cloud_handlers.calibration import KITTICalibration
 from point_cloud_handlers.labels_handler import KITTILabelHandler
 from point_cloud_handlers.plot_utils import draw_box_edges_on_plot, draw_points_on_plot
 
-load_dotenv(dotenv_path=".env")
-    
-KITTI_PATH = os.environ.get("KITTI_PATH")
-file = "000000"
 
-# Paths
-calib_path = Path(KITTI_PATH)/"calib"/f"{file}.txt"
-vel_path   = Path(KITTI_PATH)/"velodyne"/f"{file}.bin"
-img_path   = Path(KITTI_PATH)/"image_2"/f"{file}.png"
-label_file = Path(KITTI_PATH)/"label_2"/f"{file}.txt"
+def load_frame(kitti_path, file="000000"):
+    """Reads the image, LiDAR sweep, calibration and labels of one frame."""
+    import cv2
 
-# Read image and LiDAR
-image = cv2.imread(str(img_path))
-image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-lidar = np.fromfile(vel_path, dtype=np.float32).reshape(-1,4)
+    # Paths
+    calib_path = Path(kitti_path)/"calib"/f"{file}.txt"
+    vel_path   = Path(kitti_path)/"velodyne"/f"{file}.bin"
+    img_path   = Path(kitti_path)/"image_2"/f"{file}.png"
+    label_file = Path(kitti_path)/"label_2"/f"{file}.txt"
 
-# Calibration
-calib = KITTICalibration(calib_path)
-label = KITTILabelHandler(label_file)
+    # Read image and LiDAR
+    image = cv2.imread(str(img_path))
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    lidar = np.fromfile(vel_path, dtype=np.float32).reshape(-1,4)
 
+    # Calibration
+    calib = KITTICalibration(calib_path)
+    label = KITTILabelHandler(label_file)
+    return image, lidar, calib, label
+
+
+def main_plot(image, lidar, calib, label):
+    import matplotlib.pyplot as plt
 
-def main_plot():
     # Angles to visualize
     yaw_angles = [0, 0, 0]
     pitch_angles = [-15, 0, 15]
@@ -42,10 +42,11 @@ def main_plot():
         ax.imshow(empty_array)
         ax.axis('off')
 
-        img_pts, depth = calib.rotate_camera_and_project(lidar, yaw_deg=yaw_angle, pitch_deg=pitch_angle )
+        R = calib.get_camera_extrinsic(yaw=yaw_angle, pitch=pitch_angle)
+        img_pts, depth = calib.rotate_camera_and_project(lidar, R)
         draw_points_on_plot(ax, img_pts, depth, image.shape)
 
-        boxes = label.get_3d_boxes_rotated(calib, pitch_deg=pitch_angle, yaw_deg=yaw_angle)
+        boxes = label.get_3d_boxes_rotated(calib, R)
         draw_box_edges_on_plot(ax, boxes, color="red")
         
         ax.set_title("Rotated Images with 3D Object Boxes")
@@ -54,5 +55,13 @@ def main_plot():
     plt.tight_layout(rect=[0,0,1,0.95])
     plt.show()
 
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=".env")
+    main_plot(*load_frame(os.environ.get("KITTI_PATH")))
+
+
 if __name__ == '__main__':
-    main_plot()
+    main()
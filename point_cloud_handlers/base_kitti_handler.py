@@ -68,3 +68,30 @@ class KITTIHandlerBase:
         T = self._get_translation_matrix(tx, ty, tz)
         return T @ R  # Apply rotation first, then move the camera
 
+    def get_camera_extrinsics(self, poses) -> np.ndarray:
+        """
+        Vectorized get_camera_extrinsic for K poses at once.
+        Args:
+            poses: (K, 6) array of (yaw, pitch, roll, tx, ty, tz), angles in degrees
+        Returns:
+            (K, 4, 4) stack of T @ Rz @ Ry @ Rx extrinsics
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 6)
+        yaw, pitch, roll = np.radians(poses[:, :3]).T
+        K = len(poses)
+
+        def stack(rows):
+            mats = np.zeros((K, 4, 4))
+            for (i, j), value in rows.items():
+                mats[:, i, j] = value
+            return mats
+
+        c, s = np.cos(yaw), np.sin(yaw)
+        Ry = stack({(0, 0): c, (0, 2): s, (1, 1): 1, (2, 0): -s, (2, 2): c, (3, 3): 1})
+        c, s = np.cos(pitch), np.sin(pitch)
+        Rx = stack({(0, 0): 1, (1, 1): c, (1, 2): -s, (2, 1): s, (2, 2): c, (3, 3): 1})
+        c, s = np.cos(roll), np.sin(roll)
+        Rz = stack({(0, 0): c, (0, 1): -s, (1, 0): s, (1, 1): c, (2, 2): 1, (3, 3): 1})
+        T = stack({(0, 0): 1, (1, 1): 1, (2, 2): 1, (3, 3): 1,
+                   (0, 3): poses[:, 3], (1, 3): poses[:, 4], (2, 3): poses[:, 5]})
+        return T @ (Rz @ Ry @ Rx)
@@ -0,0 +1,43 @@
+import threading
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    Scratch arrays reused across calls, one flat buffer per (name, dtype) and thread,
+    grown to the largest request seen. Steady-state generation over clouds of similar
+    size then stops allocating its temporaries.
+
+    A view returned by get() is only valid until the next get() of the same name on the
+    same thread, so results handed back to callers must never alias it.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def _buffers(self):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        return buffers
+
+    def get(self, name, shape, dtype) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buffers = self._buffers()
+        key = (name, dtype.str)
+        buffer = buffers.get(key)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            buffers[key] = buffer
+        return buffer[:size].reshape(shape)
+
+    def nbytes(self):
+        """Bytes held by the calling thread's buffers."""
+        return sum(buffer.nbytes for buffer in self._buffers().values())
+
+    def clear(self):
+        self._buffers().clear()
+
+
+buffer_pool = BufferPool()
@@ -1,11 +1,62 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+
 import numpy as np
 
 from point_cloud_handlers.base_kitti_handler import KITTIHandlerBase
+from point_cloud_handlers.buffers import buffer_pool
+from point_cloud_handlers.profiling import profiler, timed
+
+
+class _LazyCalib(Mapping):
+    """
+    {key: flat array} view over the raw calib lines. Values are parsed on first access only,
+    and returned read-only so a calibration can be shared safely.
+    """
+    def __init__(self, raw: dict):
+        self._raw = raw
+        self._parsed = {}
+
+    def __getitem__(self, key):
+        value = self._parsed.get(key)
+        if value is None:
+            value = np.fromstring(self._raw[key], sep=' ')
+            value.flags.writeable = False
+            self._parsed[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+
+CAMERAS = ('P0', 'P1', 'P2', 'P3')     # gray left/right, color left/right
 
 
 class KITTICalibration(KITTIHandlerBase):
     def __init__(self, calib_file):
-        self.calib = self._read_calib_file(calib_file)
+        self._set_calib(self._read_calib_file(calib_file))
+
+    @classmethod
+    def from_text(cls, text: str):
+        return cls.from_dict(cls._parse_calib_text(text))
+
+    @classmethod
+    def from_dict(cls, calib: dict):
+        """
+        Builds a calibration from already parsed {key: flat array} entries, e.g. a packed dataset row.
+        """
+        obj = cls.__new__(cls)
+        obj._set_calib(calib)
+        return obj
+
+    def _set_calib(self, calib):
+        self.calib = calib
         self.P2 = self._get_matrix('P2', (3, 4))
         self.R0_rect = self._get_matrix('R0_rect', (3, 3))
         self.Tr_velo_to_cam = self._get_matrix('Tr_velo_to_cam', (3, 4))
@@ -13,21 +64,32 @@ class KITTICalibration(KITTIHandlerBase):
         # Convert Tr_velo_to_cam to 4x4
         self.Tr_velo_to_cam = self._to_homogeneous(self.Tr_velo_to_cam)
         self.R0_rect = self._to_homogeneous(self.R0_rect, is_rect=True)
+        for mat in (self.P2, self.R0_rect, self.Tr_velo_to_cam):
+            mat.flags.writeable = False
 
     def _read_calib_file(self, filepath):
-        data = {}
         with open(filepath, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                key, value =line.split(':', 1)
-                data[key] = np.array([float(x) for x in value.strip().split()])
-        return data
+            return self._parse_calib_text(f.read())
+
+    @staticmethod
+    def _parse_calib_text(text):
+        raw = {}
+        for line in text.splitlines():
+            key, sep, value = line.partition(':')
+            if sep:
+                raw[key.strip()] = value
+        return _LazyCalib(raw)
 
     def _get_matrix(self, key, shape):
         return self.calib[key].reshape(shape)
 
+    def get_camera_matrices(self, cameras=('P2',)):
+        """
+        Stacked (C, 3, 4) projection matrices of the named cameras (see CAMERAS). All four project
+        from the same rectified frame, they only differ by their baseline and intrinsics.
+        """
+        return np.stack([self._get_matrix(camera, (3, 4)) for camera in cameras])
+
     def _to_homogeneous(self, mat, is_rect=False):
         if is_rect:
             mat_h = np.eye(4)
@@ -44,6 +106,7 @@ class KITTICalibration(KITTIHandlerBase):
         image_points = image_points[:, :2] / image_points[:, 2:3]
         return image_points, cam_points[:, 2]  # image coords, depth
     
+    @timed("projection")
     def rotate_camera_and_project(self, lidar_points, R):
         lidar_hom = np.hstack((lidar_points[:, :3], np.ones((lidar_points.shape[0], 1))))
         cam_points = (self.Tr_velo_to_cam @ lidar_hom.T).T
@@ -52,4 +115,353 @@ class KITTICalibration(KITTIHandlerBase):
         image_points = (self.P2 @ cam_points.T).T
         image_points = image_points[:, :2] / image_points[:, 2:3]
 
-        return image_points, cam_points[:, 2]
\ No newline at end of file
+        return image_points, cam_points[:, 2]
+
+    def get_projection(self, R=None, dtype=np.float32):
+        """
+        Composes P2 @ R0_rect @ R @ Tr_velo_to_cam into a single 4x4 matrix.
+        Rows 0-2 give the homogeneous image point, row 3 the rectified depth,
+        so one matmul over the cloud yields both outputs.
+        """
+        cam_to_rect = self.R0_rect if R is None else self.R0_rect @ R
+        velo_to_rect = cam_to_rect @ self.Tr_velo_to_cam
+        fused = np.vstack((self.P2 @ velo_to_rect, velo_to_rect[2]))
+        return fused.astype(dtype)
+
+    @staticmethod
+    def _xyz(lidar_points, dtype=None):
+        """
+        The xyz columns in the compute dtype (the cloud's own by default). A cast goes
+        through the buffer pool rather than a fresh copy of the cloud.
+        """
+        xyz = lidar_points[:, :3]
+        if dtype is None or xyz.dtype == dtype:
+            return xyz
+        cast = buffer_pool.get("xyz", xyz.shape, dtype)
+        np.copyto(cast, xyz)
+        return cast
+
+    def project_points(self, lidar_points, fused, out=None, dtype=None):
+        """
+        Projects lidar points with a fused matrix from get_projection in a single pass.
+        Works directly on the xyz columns, no homogeneous copy of the cloud is made.
+        Args:
+            out: optional (image_points (N, 2), depth (N,)) arrays to write the result into
+            dtype: compute dtype, defaults to the cloud's (float32 for KITTI sweeps)
+        Returns:
+            image_points: (N, 2), depth: (N,)
+        """
+        xyz = self._xyz(lidar_points, dtype)
+        fused = fused.astype(xyz.dtype, copy=False)
+        N = xyz.shape[0]
+        proj = buffer_pool.get("proj", (N, 4), xyz.dtype)
+        np.matmul(xyz, fused[:, :3].T, out=proj)
+        proj += fused[:, 3]
+
+        if out is None:
+            out = np.empty((N, 2), dtype=xyz.dtype), np.empty(N, dtype=xyz.dtype)
+        image_points, depth = out
+        np.divide(proj[:, :2], proj[:, 2:3], out=image_points)
+        depth[:] = proj[:, 3]
+        return image_points, depth
+
+    def project_lidar_pose(self, lidar_points, yaw=0, pitch=0, roll=0, tx=0, ty=0, tz=0):
+        """
+        Fused equivalent of rotate_camera_and_project(lidar_points, get_camera_extrinsic(...)).
+        """
+        R = self.get_camera_extrinsic(yaw=yaw, pitch=pitch, roll=roll, tx=tx, ty=ty, tz=tz)
+        fused = self.get_projection(R, dtype=lidar_points.dtype)
+        return self.project_points(lidar_points, fused)
+
+    def get_projections(self, extrinsics, dtype=np.float32):
+        """
+        Stacked version of get_projection: (K, 4, 4) extrinsics -> (K, 4, 4) fused matrices.
+        """
+        velo_to_rect = self.R0_rect @ np.asarray(extrinsics) @ self.Tr_velo_to_cam
+        fused = np.concatenate((self.P2 @ velo_to_rect, velo_to_rect[:, 2:3]), axis=1)
+        return fused.astype(dtype)
+
+    def project_points_multi(self, lidar_points, extrinsics, chunk_size=None, out=None, dtype=None):
+        """
+        Projects one cloud into K virtual cameras with a single batched matmul.
+        Args:
+            lidar_points: (N, >=3) lidar array
+            extrinsics: (K, 4, 4) stack of get_camera_extrinsic matrices
+            chunk_size: optional max number of points per pass, bounds the
+                        (K, 4, chunk_size) temporary when K x N is large
+            out: optional (image_points (K, N, 2), depth (K, N)) arrays to write the result into,
+                 e.g. np.memmap arrays when the result itself does not fit in memory
+            dtype: compute dtype, defaults to the cloud's
+        Returns:
+            image_points: (K, N, 2), depth: (K, N)
+        chunk_size alone does not bound the result; iter_project_points_multi never holds more
+        than one chunk of it.
+        """
+        xyz = self._xyz(lidar_points, dtype)
+        fused = self.get_projections(extrinsics, dtype=xyz.dtype)
+        K, N = fused.shape[0], xyz.shape[0]
+        if out is None:
+            out = np.empty((K, N, 2), dtype=xyz.dtype), np.empty((K, N), dtype=xyz.dtype)
+        image_points, depth = out
+        step = N if chunk_size is None else max(int(chunk_size), 1)
+        for start in range(0, N, step):
+            stop = min(start + step, N)
+            self._project_chunk(fused, xyz, start, stop, image_points[:, start:stop], depth[:, start:stop])
+        return image_points, depth
+
+    def iter_project_points_multi(self, lidar_points, extrinsics, chunk_size, dtype=None):
+        """
+        project_points_multi one chunk of points at a time, so neither the temporaries nor the
+        results grow with N.
+        Yields:
+            start, stop, image_points: (K, stop - start, 2), depth: (K, stop - start) of points
+            start:stop; both live in the buffer pool and are only valid until the next chunk
+        """
+        xyz = self._xyz(lidar_points, dtype)
+        fused = self.get_projections(extrinsics, dtype=xyz.dtype)
+        K, N = fused.shape[0], xyz.shape[0]
+        step = max(int(chunk_size), 1)
+        for start in range(0, N, step):
+            stop = min(start + step, N)
+            image_points = buffer_pool.get("chunk_points", (K, stop - start, 2), xyz.dtype)
+            depth = buffer_pool.get("chunk_depth", (K, stop - start), xyz.dtype)
+            self._project_chunk(fused, xyz, start, stop, image_points, depth)
+            yield start, stop, image_points, depth
+
+    @staticmethod
+    def _project_chunk(fused, xyz, start, stop, image_points, depth):
+        """Projects points start:stop with the (K, 4, 4) fused matrices into image_points and depth."""
+        K = fused.shape[0]
+        proj = buffer_pool.get("proj", (K * 4, stop - start), xyz.dtype)
+        np.matmul(fused[:, :, :3].reshape(K * 4, 3), xyz[start:stop].T, out=proj)   # all poses in one GEMM
+        proj = proj.reshape(K, 4, stop - start)
+        proj += fused[:, :, 3:]
+        np.divide(proj[:, 0], proj[:, 2], out=image_points[..., 0])
+        np.divide(proj[:, 1], proj[:, 2], out=image_points[..., 1])
+        depth[:] = proj[:, 3]
+
+    @staticmethod
+    def _divide_inside(u, v, w, idx, image_shape):
+        """
+        Image points (u / w, v / w) of the points idx that passed the side-plane tests, minus those
+        the divide rounds onto the far border: u < W * w does not guarantee u / w < W, and the
+        image bounds are strict, 0 <= x < W and 0 <= y < H.
+        Returns:
+            image_points: (V, 2), idx: (V,) the points kept
+        """
+        H, W = image_shape[:2]
+        w = w[idx]
+        image_points = np.empty((len(idx), 2), dtype=np.result_type(u, w))
+        np.divide(u[idx], w, out=image_points[:, 0])
+        np.divide(v[idx], w, out=image_points[:, 1])
+        outside = (image_points[:, 0] >= W) | (image_points[:, 1] >= H)
+        if outside.any():
+            keep = ~outside
+            return image_points[keep], idx[keep]
+        return image_points, idx
+
+    def project_visible(self, lidar_points, fused, image_shape, dtype=None):
+        """
+        Culls points outside the view frustum before projecting, so the divide and
+        any rendering only touch what lands in the image.
+        Returns:
+            image_points: (V, 2) within 0 <= x < W, 0 <= y < H, depth: (V,),
+            indices: (V,) of the visible points in lidar_points
+        """
+        dtype = lidar_points.dtype if dtype is None else np.dtype(dtype)
+        fused = fused.astype(dtype, copy=False)
+        H, W = image_shape[:2]
+
+        # Near plane on the whole cloud, a single dot product per point
+        xyz = self._xyz(lidar_points, dtype)
+        idx = np.flatnonzero(xyz @ fused[3, :3] + fused[3, 3] > 0)
+        rows = np.take(xyz, idx, axis=0, out=buffer_pool.get("gather", (len(idx), 3), dtype))
+        proj = buffer_pool.get("proj", (len(idx), 4), dtype)
+        np.matmul(rows, fused[:, :3].T, out=proj)
+        proj += fused[:, 3]
+
+        # Side planes on the survivors, still without dividing
+        u, v, w = proj[:, 0], proj[:, 1], proj[:, 2]
+        inside = (u >= 0) & (v >= 0) & (u < W * w) & (v < H * w)
+        image_points, rows = self._divide_inside(u, v, w, np.flatnonzero(inside), image_shape)
+        return image_points, proj[rows, 3], idx[rows]
+
+    @staticmethod
+    def _frustum_mask(u, v, w, depth, image_shape):
+        """
+        The five plane tests of one pose's (u, v, w, depth) rows, without dividing.
+        The mask is a buffer pool view, valid until the next call.
+        """
+        H, W = image_shape[:2]
+        inside = buffer_pool.get("inside", depth.shape, bool)
+        test = buffer_pool.get("test", depth.shape, bool)
+        edge = buffer_pool.get("edge", depth.shape, depth.dtype)
+        np.greater(depth, 0, out=inside)
+        inside &= np.greater_equal(u, 0, out=test)
+        inside &= np.greater_equal(v, 0, out=test)
+        inside &= np.less(u, np.multiply(w, W, out=edge), out=test)
+        inside &= np.less(v, np.multiply(w, H, out=edge), out=test)
+        return inside
+
+    @timed("projection")
+    def project_visible_multi(self, lidar_points, extrinsics, image_shape, index=None, dtype=None):
+        """
+        project_visible for a (K, 4, 4) stack of poses. The five plane tests of every pose
+        are rows of one (4K, 3) x (3, N) GEMM, and only the visible points are divided.
+        With an AzimuthIndex built on lidar_points, each pose instead projects only the
+        contiguous azimuth sectors its field of view spans, and its indices come out in the
+        index's order rather than ascending. Poses the index cannot narrow down (translated,
+        or looking at a pole) still share the batched full scan.
+        The GEMM output and the plane masks live in the buffer pool, only the per-pose
+        results are allocated.
+        Returns:
+            list of K (image_points, depth, indices) tuples
+        """
+        dtype = lidar_points.dtype if dtype is None else np.dtype(dtype)
+        if index is None:
+            return self._project_visible_batched(lidar_points, extrinsics, image_shape, dtype)
+
+        spans = index.query(self, extrinsics, image_shape)
+        full = [k for k, slices in enumerate(spans) if slices is None]
+        results = [None] * len(spans)
+        if full:
+            batched = self._project_visible_batched(lidar_points, np.asarray(extrinsics)[full], image_shape, dtype)
+            for k, visible in zip(full, batched):
+                results[k] = visible
+
+        fused = self.get_projections(extrinsics, dtype=dtype)
+        points = index.points.astype(dtype, copy=False)
+        for k, slices in enumerate(spans):
+            if slices is None:
+                continue
+            parts = []
+            for start, stop in slices:
+                proj = buffer_pool.get("proj", (4, stop - start), dtype)
+                np.matmul(fused[k, :, :3], points[:, start:stop], out=proj)
+                proj += fused[k, :, 3:]
+                u, v, w, depth = proj
+                inside = self._frustum_mask(u, v, w, depth, image_shape)
+                image_points, idx = self._divide_inside(u, v, w, np.flatnonzero(inside), image_shape)
+                parts.append((image_points, depth[idx], index.order[start + idx]))
+            if len(parts) == 1:
+                results[k] = parts[0]
+            else:
+                results[k] = tuple(np.concatenate(column) for column in zip(*parts))
+        return results
+
+    def _project_visible_batched(self, lidar_points, extrinsics, image_shape, dtype):
+        xyz = self._xyz(lidar_points, dtype)
+        fused = self.get_projections(extrinsics, dtype=dtype)
+        K, N = fused.shape[0], xyz.shape[0]
+
+        proj = buffer_pool.get("proj", (K * 4, N), dtype)
+        np.matmul(fused[:, :, :3].reshape(K * 4, 3), xyz.T, out=proj)
+        proj = proj.reshape(K, 4, N)
+        proj += fused[:, :, 3:]
+
+        results = []
+        for u, v, w, depth in proj:
+            inside = self._frustum_mask(u, v, w, depth, image_shape)
+            image_points, idx = self._divide_inside(u, v, w, np.flatnonzero(inside), image_shape)
+            results.append((image_points, depth[idx], idx))
+        return results
+
+    @timed("projection")
+    def project_visible_cameras(self, lidar_points, extrinsics, image_shape, cameras=('P2',), dtype=None):
+        """
+        project_visible for every (pose, camera) pair. The cloud goes into the rectified frame
+        of every pose once, with one (3K, 3) x (3, N) GEMM. The near plane (depth > 0) is the
+        rectified z, so it is culled there once for every camera, and each pose's survivors are
+        projected into all C cameras with one stacked (3C, 3) x (3, V) GEMM.
+        image_shape applies to every camera, KITTI images of a frame all have the same size.
+        Returns:
+            K lists of C (image_points, depth, indices) tuples
+        """
+        dtype = lidar_points.dtype if dtype is None else np.dtype(dtype)
+        xyz = self._xyz(lidar_points, dtype)
+        velo_to_rect = (self.R0_rect @ np.asarray(extrinsics) @ self.Tr_velo_to_cam)[:, :3].astype(dtype)
+        P = self.get_camera_matrices(cameras).astype(dtype)
+        K, N, C = len(velo_to_rect), xyz.shape[0], len(P)
+        H, W = image_shape[:2]
+
+        rect = buffer_pool.get("rect", (K * 3, N), dtype)
+        np.matmul(velo_to_rect[:, :, :3].reshape(K * 3, 3), xyz.T, out=rect)
+        rect = rect.reshape(K, 3, N)
+        rect += velo_to_rect[:, :, 3:]
+
+        linear, offset = P[:, :, :3].reshape(C * 3, 3), P[:, :, 3:]
+        results = []
+        for points in rect:
+            # Near plane once for every camera, then all cameras on the survivors
+            front = np.flatnonzero(points[2] > 0)
+            V = len(front)
+            rows = np.take(points, front, axis=1, out=buffer_pool.get("gather", (3, V), dtype))
+            proj = buffer_pool.get("proj", (C * 3, V), dtype)
+            np.matmul(linear, rows, out=proj)
+            stacked = proj.reshape(C, 3, V)
+            stacked += offset
+            inside = buffer_pool.get("inside", (V,), bool)
+            test = buffer_pool.get("test", (V,), bool)
+            edge = buffer_pool.get("edge", (V,), dtype)
+            cameras_out = []
+            for u, v, w in stacked:
+                np.greater_equal(u, 0, out=inside)
+                inside &= np.greater_equal(v, 0, out=test)
+                inside &= np.less(u, np.multiply(w, W, out=edge), out=test)
+                inside &= np.less(v, np.multiply(w, H, out=edge), out=test)
+                image_points, idx = self._divide_inside(u, v, w, np.flatnonzero(inside), image_shape)
+                cameras_out.append((image_points, rows[2, idx], front[idx]))
+            results.append(cameras_out)
+        return results
+
+class CalibrationCache:
+    """
+    LRU cache of KITTICalibration keyed by file content, so frames sharing a calibration
+    share one immutable instance. Safe to share between the pipeline reader threads: the file
+    is read and parsed outside the lock, only the cache bookkeeping is serialized.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, calib_file) -> KITTICalibration:
+        data = Path(calib_file).read_bytes()
+        profiler.count("bytes_read", len(data))
+        key = hashlib.blake2b(data, digest_size=16).digest()
+        with self._lock:
+            calib = self._cache.get(key)
+            if calib is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return calib
+            self.misses += 1
+
+        calib = KITTICalibration.from_text(data.decode())
+        with self._lock:
+            # Another thread may have parsed the same file meanwhile, keep the first instance
+            calib = self._cache.setdefault(key, calib)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return calib
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+
+calibration_cache = CalibrationCache()
+
+
+@timed("load.calib")
+def load_calibration(calib_file) -> KITTICalibration:
+    """Loads a calibration through the process-wide content-keyed cache."""
+    return calibration_cache.load(calib_file)
@@ -1,112 +1,611 @@
 import numpy as np
-import cv2
 from pathlib import Path
 import os
-from dotenv import load_dotenv
-import matplotlib.pyplot as plt
-
-from point_cloud_handlers.calibration import KITTICalibration
-from point_cloud_handlers.labels_handler import KITTILabelHandler
-from point_cloud_handlers.plot_utils import draw_points_on_plot
-from point_cloud_handlers.yolo_adapter import rects_to_yolo, save_yolo_label
-
-from tqdm import tqdm
-
-
-def get_file_data(file):
-    img_path = img_dir_path / f"{file}.png"
-    vel_path = vel_dir_path / f"{file}.bin"
-    calib_path = calib_dir_path / f"{file}.txt"
-    label_file = label_dir_path / f"{file}.txt"
-
-    # Read image and LiDAR
-    image = cv2.imread(str(img_path))
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    lidar = np.fromfile(vel_path, dtype=np.float32).reshape(-1,4)
-
-    # Calibration and Labels
-    calib = KITTICalibration(calib_path)
-    label_handler = KITTILabelHandler(label_file)
-    return image, lidar, calib, label_handler
-
-def create_file_variants(file):
-    image, lidar, calib, label_handler = get_file_data(file)
-    
-    for i, (yaw_angle, pitch_angle, roll_angle, tx, ty, tz) in enumerate(
-        zip(yaw_angles, pitch_angles, roll_angles, tx_s, ty_s, tz_s)
-    ):
-        dataset_path = Path("datasets") / f"dataset_{i}"
-        image_dir = dataset_path / "images"
-        label_dir = dataset_path / "labels"
-        readme_file = dataset_path / "DatasetInfo.md"
-        
-        image_dir.mkdir(parents=True, exist_ok=True)
-        label_dir.mkdir(parents=True, exist_ok=True)
-        
-        if not readme_file.exists(): 
-            create_readme_file(yaw_angle, pitch_angle, roll_angle, tx, ty, tz, readme_file)
-            
-        # Project LiDAR and get 3D boxes
-        R = calib.get_camera_extrinsic(
-            yaw=yaw_angle, pitch=pitch_angle, roll=roll_angle,
-            tx=tx, ty=ty, tz=tz)
-        
-        img_pts, depth = calib.rotate_camera_and_project(lidar, R)
-        fig = draw_image(image, img_pts, depth)
-        save_image(file, image_dir, fig)
-        
-        objects_type, objects_rect = label_handler.get_2d_boxes_rotated(calib, R)
-        save_labels(file, image, label_dir, objects_type, objects_rect) 
-        
-def draw_image(image, img_pts, depth):
-    fig, ax = plt.subplots()
-    empty_array = np.zeros(image.shape[:2], dtype=np.uint8)
-    ax.imshow(empty_array, cmap='gray')
-    draw_points_on_plot(ax, img_pts, depth, image.shape)
-    ax.axis("off")
-    return fig
-
-def save_labels(file, image, label_dir, objects_type, objects_rect):
+import argparse
+import time
+import multiprocessing as mp
+from collections import Counter
+from functools import partial
+
+from point_cloud_handlers.calibration import CAMERAS, calibration_cache
+from point_cloud_handlers.decimation import REDUCTIONS, VoxelDecimator
+from point_cloud_handlers.image_store import ImageShardIndex, ImageShardWriter
+from point_cloud_handlers.kitti_dataset import KITTIDataset, KITTIPaths
+from point_cloud_handlers.label_writer import LabelShardIndex, YOLOLabelWriter
+from point_cloud_handlers.lidar_views import BEVGrid, RangeImage, save_view_file, transform_to_poses
+from point_cloud_handlers.manifest import Manifest, params_digest
+from point_cloud_handlers.pipeline import StreamingPipeline
+from point_cloud_handlers.poses import PoseTable, as_pose_table
+from point_cloud_handlers.profiling import profiler, timed
+from point_cloud_handlers.rasterizer import get_colormap_lut, rasterize_points
+from point_cloud_handlers.spatial_index import AzimuthIndex
+from point_cloud_handlers.visibility import VisibilityFilter
+from point_cloud_handlers.yolo_adapter import corners_to_yolo_obb, rects_to_yolo, rects_to_yolo_array, save_yolo_label
+
+
+def dataset_name(i: int, camera="P2"):
+    """dataset_{i} for the P2 color camera every dataset was generated from so far, dataset_{i}_{camera} otherwise."""
+    return f"dataset_{i}" if camera == "P2" else f"dataset_{i}_{camera}"
+
+def get_dataset_dirs(output_dir: Path, i: int, camera="P2"):
+    dataset_path = Path(output_dir) / dataset_name(i, camera)
+    return dataset_path / "images", dataset_path / "labels"
+
+def output_slots(num_poses, cameras=("P2",)):
+    """(pose index, camera) of every image/label output, camera-major: the writers' pose_index is c * K + i."""
+    return [(i, camera) for camera in cameras for i in range(num_poses)]
+
+def get_view_dirs(output_dir: Path, i: int, name: str):
+    """Array and label directories of a lidar view (e.g. "bev") of pose i."""
+    dataset_path = Path(output_dir) / f"dataset_{i}"
+    return dataset_path / name, dataset_path / f"{name}_labels"
+
+def prepare_output_dirs(poses, output_dir: Path, views=(), cameras=("P2",)):
+    """
+    Creates the per-pose (and per-camera) dataset directories, their DatasetInfo.md files and a
+    poses.csv of the whole table once, before any frame is written. Lidar views do not depend on
+    the camera and always go to dataset_{i}.
+    """
+    poses = as_pose_table(poses)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    poses.save(Path(output_dir) / "poses.csv")
+    for i, (yaw_angle, pitch_angle, roll_angle, tx, ty, tz) in enumerate(poses):
+        for camera in cameras:
+            image_dir, label_dir = get_dataset_dirs(output_dir, i, camera)
+            image_dir.mkdir(parents=True, exist_ok=True)
+            label_dir.mkdir(parents=True, exist_ok=True)
+            create_readme_file(i, yaw_angle, pitch_angle, roll_angle, tx, ty, tz, image_dir.parent / "DatasetInfo.md",
+                               camera)
+        for name in views:
+            view_dir, view_label_dir = get_view_dirs(output_dir, i, name)
+            view_dir.mkdir(parents=True, exist_ok=True)
+            if name == "bev":
+                view_label_dir.mkdir(exist_ok=True)
+
+def pose_outputs_exist(file, i, output_dir: Path, views=(), label_shards=None, image_shards=None, cameras=("P2",)):
+    """
+    Whether pose i of a frame has its image and labels for every camera, and an array per lidar view.
+    Labels and images are looked up in label_shards / image_shards (a LabelShardIndex /
+    ImageShardIndex per (pose, camera)) when given, else as files.
+    """
+    for camera in cameras:
+        image_dir, label_dir = get_dataset_dirs(output_dir, i, camera)
+        if image_shards is not None:
+            if file not in image_shards[i, camera]:
+                return False
+        elif not (image_dir / f"{file}.png").exists():
+            return False
+        if label_shards is not None:
+            if file not in label_shards[i, camera]:
+                return False
+        elif not (label_dir / f"{file}.txt").exists():
+            return False
+    for name in views:
+        if not (get_view_dirs(output_dir, i, name)[0] / f"{file}.npz").exists():
+            return False
+    return True
+
+@timed("compute")
+def render_file_variants(file, frame, poses, output_dir=Path("datasets"), render_options=None, spatial_index=False,
+                         dtype=None, lidar_views=None, label_writer=None, image_writer=None, pose_indices=None,
+                         visibility=None, cameras=None, decimator=None):
+    """
+    Projects, renders and labels one loaded frame for every pose, or only for pose_indices.
+    With spatial_index, an azimuth index of the sweep is built once and each
+    pose only projects the sectors inside its field of view.
+    dtype is the projection compute dtype, the cloud's own (float32) by default.
+    lidar_views maps a view name to a BEVGrid or RangeImage rasterized for every pose as well,
+    BEV grids also get their label boxes as YOLO OBB files.
+    With a YOLOLabelWriter the labels go through it, otherwise each is written by save_labels.
+    With an ImageShardWriter the images are packed into its shards instead of written by save_image;
+    in its "points" format the visible points are stored and nothing is rasterized.
+    With a VisibilityFilter the 2D boxes are clipped to the image, and off-screen boxes and boxes
+    hidden behind nearer points (checked against the same projection) are not labelled.
+    cameras names the KITTI cameras to render, ("P2",) by default. Several cameras share one
+    transform of the sweep per pose (project_visible_cameras); spatial_index only applies to P2 alone.
+    With a VoxelDecimator the sweep is downsampled once, and every pose and camera projects, renders
+    and checks visibility against that reduced cloud; the lidar views still use the full sweep.
+    Returns the disk writes as zero-argument jobs, so callers decide where they run.
+    """
+    image_shape, lidar, calib, label_handler = frame
+    points = lidar if decimator is None else decimator(lidar)
+
+    # Project LiDAR into every pose (and camera) at once, keeping only the points each camera sees
+    extrinsics = as_pose_table(poses).extrinsics()
+    num_poses = len(extrinsics)
+    pose_indices = range(num_poses) if pose_indices is None else list(pose_indices)
+    extrinsics = extrinsics[pose_indices]
+    cameras = tuple(cameras or ("P2",))
+    if cameras == ("P2",):
+        index = AzimuthIndex(points, calib) if spatial_index else None
+        visible = [[pose] for pose in calib.project_visible_multi(points, extrinsics, image_shape, index=index, dtype=dtype)]
+        all_rects, all_behind, all_near = label_handler.get_2d_rects(calib, extrinsics, with_depth=True)
+        all_rects, all_behind, all_near = all_rects[:, None], all_behind[:, None], all_near[:, None]
+    else:
+        visible = calib.project_visible_cameras(points, extrinsics, image_shape, cameras, dtype=dtype)
+        all_rects, all_behind, all_near = label_handler.get_2d_rects(calib, extrinsics, cameras, with_depth=True)
+    types = label_handler.types
+    if visibility is not None:
+        box_ids = visibility.box_ids(points, calib, label_handler.objects)
+
+    jobs = []
+    for k, i in enumerate(pose_indices):
+        for c, camera in enumerate(cameras):
+            image_dir, label_dir = get_dataset_dirs(output_dir, i, camera)
+            slot = c * num_poses + i
+
+            img_pts, depth, _ = visible[k][c]
+            if image_writer is not None and image_writer.fmt == "points":
+                jobs.append(partial(image_writer.add_points, file, slot, img_pts, depth, image_shape))
+            else:
+                canvas = draw_image(image_shape, img_pts, depth, **(render_options or {}))
+                if image_writer is None:
+                    jobs.append(partial(save_image, file, image_dir, canvas))
+                else:
+                    jobs.append(partial(image_writer.add, file, slot, canvas))
+
+            rects, keep = all_rects[k, c], ~all_behind[k, c]
+            if visibility is not None:
+                rects, keep, _ = visibility.filter(
+                    rects, all_behind[k, c], all_near[k, c], box_ids, visible[k][c], image_shape)
+            objects_type = [obj_type for obj_type, kept in zip(types, keep) if kept]
+            if label_writer is None:
+                jobs.append(partial(save_labels, file, image_shape, label_dir, objects_type, rects[keep]))
+            else:
+                # Timed like save_labels, whose conversion this is; the writer thread times the rest
+                with profiler.stage("write.labels"):
+                    class_ids, boxes = rects_to_yolo_array(rects[keep], image_shape, objects_type)
+                jobs.append(partial(label_writer.add, file, slot, class_ids, boxes))
+
+    if lidar_views:
+        jobs += render_lidar_views(file, lidar, calib, label_handler, extrinsics, output_dir, lidar_views, pose_indices)
+    return jobs
+
+@timed("render.views")
+def render_lidar_views(file, lidar, calib, label_handler, extrinsics, output_dir, lidar_views, pose_indices=None):
+    """
+    Rasterizes every lidar view for every pose from one transform of the sweep per pose.
+    pose_indices are the output pose numbers of the extrinsics, 0..K-1 by default.
+    Returns the disk writes as zero-argument jobs.
+    """
+    pose_indices = range(len(extrinsics)) if pose_indices is None else pose_indices
+    posed = transform_to_poses(lidar, calib, extrinsics)
+    intensity = lidar[:, 3]
+    types = label_handler.types
+
+    jobs = []
+    for name, view in lidar_views.items():
+        for k, (i, points) in enumerate(zip(pose_indices, posed)):
+            view_dir, view_label_dir = get_view_dirs(output_dir, i, name)
+            jobs.append(partial(save_view, file, view_dir, view.rasterize(points, intensity), view.channels))
+            if isinstance(view, BEVGrid):
+                corners, inside = view.boxes(label_handler, extrinsics[k])
+                objects_type = [obj_type for obj_type, k in zip(types, inside) if k]
+                jobs.append(partial(save_bev_labels, file, view.shape, view_label_dir, objects_type, corners[inside]))
+    return jobs
+
+def create_file_variants(file, source, poses, **frame_options):
+    """
+    Renders and labels one frame for every pose. source is a KITTIPaths or a packed KITTIDataset,
+    frame_options are passed on to render_file_variants.
+    """
+    for job in render_file_variants(file, source.load_frame(file), poses, **frame_options):
+        job()
+
+@timed("render")
+def draw_image(image_shape, img_pts, depth, **render_options):
+    """Renders the projected points on a black canvas at the exact source image resolution."""
+    return rasterize_points(img_pts, depth, image_shape, **render_options)
+
+@timed("write.labels")
+def save_labels(file, image_shape, label_dir, objects_type, objects_rect):
     label_filename = label_dir / f"{file}.txt"
-    yolo_lines = rects_to_yolo(objects_rect, image.shape, class_names=objects_type)
+    yolo_lines = rects_to_yolo(objects_rect, image_shape, class_names=objects_type)
     save_yolo_label(output=label_filename, yolo_lines=yolo_lines)
+    if profiler.enabled:
+        profiler.count("bytes_written", label_filename.stat().st_size)
+
+@timed("write.image")
+def save_image(file, image_dir, canvas):
+    import cv2
 
-def save_image(file, image_dir, fig):
     image_filename = image_dir / f"{file}.png"
-    fig.savefig(image_filename, bbox_inches='tight', pad_inches=0)
-    plt.close(fig)
+    cv2.imwrite(str(image_filename), cv2.cvtColor(canvas, cv2.COLOR_RGB2BGR))
+    if profiler.enabled:
+        profiler.count("bytes_written", image_filename.stat().st_size)
+
+@timed("write.view")
+def save_view(file, view_dir, grid, channels):
+    view_filename = view_dir / f"{file}.npz"
+    save_view_file(view_filename, grid, channels)
+    if profiler.enabled:
+        profiler.count("bytes_written", view_filename.stat().st_size)
+
+@timed("write.labels")
+def save_bev_labels(file, grid_shape, label_dir, objects_type, corners):
+    label_filename = label_dir / f"{file}.txt"
+    save_yolo_label(output=label_filename, yolo_lines=corners_to_yolo_obb(corners, grid_shape, class_names=objects_type))
+    if profiler.enabled:
+        profiler.count("bytes_written", label_filename.stat().st_size)
 
-def create_readme_file(yaw_angle, pitch_angle, roll_angle, tx, ty, tz, readme_file):
+def create_readme_file(i, yaw_angle, pitch_angle, roll_angle, tx, ty, tz, readme_file, camera="P2"):
     with open(readme_file, 'w') as f:
         f.write(
-            "# Dataset {i} \n" \
-            f"yaw_angle: {yaw_angle}, pitch_angle: {pitch_angle}, roll_angle: {roll_angle} \n" \
-            f"tx: {tx}, ty: {ty}, tz: {tz} \n"
+            f"# Dataset {i} \n" \
+            f"yaw_angle: {yaw_angle:.12g}, pitch_angle: {pitch_angle:.12g}, roll_angle: {roll_angle:.12g} \n" \
+            f"tx: {tx:.12g}, ty: {ty:.12g}, tz: {tz:.12g} \n"
         )
+        if camera != "P2":
+            f.write(f"camera: {camera} \n")
+
+
+# Per-process state, set once by _init_worker so tasks only carry frame ids
+_worker_args = {}
+
+def _init_worker(source, poses, frame_options, pipeline_options, profile=False, label_options=None,
+                 image_options=None):
+    # Workers must not oversubscribe the cores with cv2 threads; point shards never load cv2
+    if image_options is None or image_options.get("fmt") != "points":
+        import cv2
+
+        cv2.setNumThreads(1)
+    if profile:
+        profiler.enable()
+    slots = output_slots(len(poses), frame_options.get("cameras") or ("P2",))
+    image_dirs, label_dirs = zip(*(get_dataset_dirs(frame_options["output_dir"], i, camera) for i, camera in slots))
+    if label_options is not None:
+        frame_options = dict(frame_options, label_writer=YOLOLabelWriter(label_dirs, **label_options))
+    if image_options is not None:
+        frame_options = dict(frame_options, image_writer=ImageShardWriter(image_dirs, **image_options))
+    _worker_args.update(
+        source=source, poses=poses, frame_options=frame_options, pipeline_options=pipeline_options)
+
+def _process_frames(tasks):
+    """
+    Runs a chunk of (frame id, pose indices) tasks, through a StreamingPipeline when pipeline
+    options are set.
+    Returns (tasks done, pid, calibration cache stats, pipeline stage stats, profiler snapshot or None).
+    """
+    source, poses = _worker_args["source"], _worker_args["poses"]
+    frame_options, pipeline_options = _worker_args["frame_options"], _worker_args["pipeline_options"]
+
+    stage_stats = {}
+    if pipeline_options is None:
+        for file, pose_indices in tasks:
+            create_file_variants(file, source, poses, pose_indices=pose_indices, **frame_options)
+    else:
+        pipeline = StreamingPipeline(
+            read_fn=lambda task: source.load_frame(task[0]),
+            compute_fn=lambda task, frame: render_file_variants(
+                task[0], frame, poses, pose_indices=task[1], **frame_options),
+            **pipeline_options)
+        pipeline.run(tasks)
+        stage_stats = {name: stage.as_dict() for name, stage in pipeline.stats.items()}
+    # Every chunk ends with its outputs on disk, one shard per pose when sharding
+    for writer in _chunk_writers(frame_options):
+        writer.flush()
+    trace = profiler.snapshot() if profiler.enabled else None
+    return tasks, os.getpid(), calibration_cache.stats(), stage_stats, trace
+
+# Worker and thread counts, which change how fast outputs are written but not what is written
+RUNTIME_OPTIONS = ("encode_workers", "read_workers", "write_workers", "prefetch", "write_queue_size", "queue_size")
+
+def output_settings(options):
+    """options without its RUNTIME_OPTIONS, the part of it the manifest's params digest covers."""
+    if options is None:
+        return None
+    return {key: value for key, value in options.items() if key not in RUNTIME_OPTIONS}
+
+def plan_generation(source, poses, frame_ids, output_dir: Path, manifest: Manifest, params, resume=True, views=(),
+                    label_shards=None, image_shards=None, cameras=("P2",)):
+    """
+    Decides which (frame, pose) outputs to generate. With resume, an output is kept when it exists
+    and the manifest recorded it with the frame's current input digest and the pose's params digest;
+    without a manifest yet, existing outputs are adopted as current.
+    Returns:
+        tasks: list of (frame id, pose indices to generate)
+        inputs: {frame id: input digest}
+        reasons: Counter of (pose index, reason) for every output to generate, reason being
+                 "missing", "new", "inputs", "params" or "forced"
+    """
+    adopt = not manifest.outputs
+    tasks, inputs, reasons = [], {}, Counter()
+    for file in frame_ids:
+        inputs[file] = manifest.input_digest(source, file)
+        stale = []
+        for i in range(len(poses)):
+            if not resume:
+                reason = "forced"
+            elif not pose_outputs_exist(file, i, output_dir, views, label_shards, image_shards, cameras):
+                reason = "missing"
+            elif adopt:
+                reason = None
+            else:
+                reason = manifest.stale_reason(f"dataset_{i}", file, inputs[file], params[i])
+            if reason is not None:
+                stale.append(i)
+                reasons[i, reason] += 1
+        if stale:
+            tasks.append((file, tuple(stale)))
+    return tasks, inputs, reasons
+
+def _print_plan(reasons, num_poses, num_frames):
+    print(f"{'pose':<12}{'missing':>9}{'new':>9}{'inputs':>9}{'params':>9}{'forced':>9}{'current':>9}")
+    for i in range(num_poses):
+        counts = [reasons[i, reason] for reason in ("missing", "new", "inputs", "params", "forced")]
+        print(f"{f'dataset_{i}':<12}" + "".join(f"{c:>9}" for c in counts) + f"{num_frames - sum(counts):>9}")
+
+def _chunk_writers(frame_options):
+    return [frame_options[key] for key in ("label_writer", "image_writer") if frame_options.get(key) is not None]
+
+def _merge_stage_stats(total, stage_stats):
+    for name, stats in stage_stats.items():
+        merged = total.setdefault(name, dict.fromkeys(stats, 0))
+        for key, value in stats.items():
+            merged[key] += value
+
+def generate_datasets(source, poses, output_dir=Path("datasets"), frame_ids=None, workers=1, resume=True,
+                      render_options=None, pipeline_options=None, spatial_index=False, profile=None, dtype=None,
+                      lidar_views=None, label_options=None, image_options=None, dry_run=False, visibility=None,
+                      cameras=None, decimator=None):
+    """
+    Generates every pose variant for the given frames, sharding frame ids across a process pool.
+    poses is a PoseTable or a sequence of (yaw, pitch, roll, tx, ty, tz) tuples; its extrinsics are
+    built once and shipped to the workers with it.
+    A manifest.json in output_dir records the input and parameter digests of every output. With resume,
+    only outputs that are missing, or whose frame inputs or pose parameters (including the render,
+    label, image and view settings) changed, are generated, see plan_generation. dry_run only prints
+    that plan.
+    render_options, spatial_index, dtype, lidar_views, visibility, cameras and decimator are passed
+    on to render_file_variants; every camera but P2 writes to its own dataset_{i}_{camera} directories.
+    pipeline_options (read_workers, write_workers, prefetch, write_queue_size) enable the
+    streaming read/compute/write pipeline inside every worker.
+    label_options (precision, text, shards) route the labels through a YOLOLabelWriter in every
+    worker, written at a fixed precision and optionally collected into one shard per pose and chunk.
+    image_options (fmt, jpeg_quality, encode_workers) pack the images of every worker chunk into
+    one ImageShardWriter shard per pose instead of one PNG per frame and pose.
+    profile enables the stage timers in every worker and prints their summary at the end;
+    a path ending in .json or .csv additionally saves the full trace there.
+    Returns the number of frames processed (or that would be, with dry_run).
+    """
+    output_dir = Path(output_dir)
+    frame_ids = source.frame_ids() if frame_ids is None else list(frame_ids)
+    poses = as_pose_table(poses)
+    poses.extrinsics()
+    views = tuple(lidar_views or ())
+    cameras = tuple(cameras or ("P2",))
+    settings = dict(render_options=render_options, dtype=str(dtype), lidar_views=lidar_views,
+                    label_options=output_settings(label_options), image_options=output_settings(image_options),
+                    visibility=visibility)
+    if cameras != ("P2",):
+        settings["cameras"] = cameras
+    if decimator is not None:
+        settings["decimator"] = decimator
+    params = [params_digest(pose, settings) for pose in poses]
+
+    manifest = Manifest(output_dir / "manifest.json")
+    slots = output_slots(len(poses), cameras)
+    label_shards = None
+    if label_options is not None and not label_options.get("text", True):
+        label_shards = {slot: LabelShardIndex(get_dataset_dirs(output_dir, *slot)[1]) for slot in slots}
+    image_shards = None
+    if image_options is not None:
+        image_shards = {slot: ImageShardIndex(get_dataset_dirs(output_dir, *slot)[0]) for slot in slots}
+    pending, inputs, reasons = plan_generation(
+        source, poses, frame_ids, output_dir, manifest, params, resume, views, label_shards, image_shards, cameras)
+    if len(pending) < len(frame_ids):
+        print(f"Skipping {len(frame_ids) - len(pending)} frames with current outputs")
+    if dry_run:
+        _print_plan(reasons, len(poses), len(frame_ids))
+        return len(pending)
+
+    prepare_output_dirs(poses, output_dir, views, cameras)
+    if not manifest.outputs:
+        # Outputs adopted as current (no manifest yet) are recorded as they are
+        stale = {(file, i) for file, pose_indices in pending for i in pose_indices}
+        for file in frame_ids:
+            for i in range(len(poses)):
+                if (file, i) not in stale:
+                    manifest.record(f"dataset_{i}", file, inputs[file], params[i])
+    manifest.save()
+
+    last_save = time.perf_counter()
+
+    def record(tasks):
+        nonlocal last_save
+        for file, pose_indices in tasks:
+            for i in pose_indices:
+                manifest.record(f"dataset_{i}", file, inputs[file], params[i])
+        if time.perf_counter() - last_save > 10:
+            manifest.save()
+            last_save = time.perf_counter()
+
+    chunk = max(1, min(32, len(pending) // (max(workers, 1) * 4)))
+    chunks = [pending[i:i + chunk] for i in range(0, len(pending), chunk)]
+    frame_options = dict(
+        output_dir=output_dir, render_options=render_options, spatial_index=spatial_index, dtype=dtype,
+        lidar_views=lidar_views, visibility=visibility, cameras=cameras, decimator=decimator)
+    init_args = (source, poses, frame_options, pipeline_options, bool(profile), label_options, image_options)
+    trace = profiler if profile else None
+
+    # Latest calibration cache stats of each process, summed pipeline stage stats
+    cache_stats = {}
+    stage_stats = {}
+
+    from tqdm import tqdm
+
+    start = time.perf_counter()
+    with tqdm(total=len(pending)) as progress:
+        if workers <= 1:
+            _init_worker(*init_args)
+            for done, pid, stats, stages, events in map(_process_frames, chunks):
+                progress.update(len(done))
+                record(done)
+                cache_stats[pid] = stats
+                _merge_stage_stats(stage_stats, stages)
+                if events is not None:
+                    trace.merge(events)
+            for writer in _chunk_writers(_worker_args["frame_options"]):
+                writer.close()
+        else:
+            with mp.Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+                for done, pid, stats, stages, events in pool.imap_unordered(_process_frames, chunks):
+                    progress.update(len(done))
+                    record(done)
+                    cache_stats[pid] = stats
+                    _merge_stage_stats(stage_stats, stages)
+                    if events is not None:
+                        trace.merge(events)
+    elapsed = time.perf_counter() - start
+    manifest.save()
+    if trace is not None:
+        profiler.disable()
+
+    if pending:
+        outputs = sum(len(pose_indices) for _, pose_indices in pending)
+        print(f"Processed {len(pending)} frames ({outputs} pose outputs) in {elapsed:.1f}s "
+              f"({len(pending) / elapsed:.2f} frames/sec)")
+        hits = sum(stats["hits"] for stats in cache_stats.values())
+        misses = sum(stats["misses"] for stats in cache_stats.values())
+        if hits + misses:
+            print(f"Calibration cache: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit rate)")
+        for name, stats in stage_stats.items():
+            print(f"Stage {name:<8} busy {stats['busy_s']:8.2f}s  wait {stats['wait_s']:8.2f}s  items {stats['items']}")
+        if trace is not None:
+            print(trace.report())
+            if isinstance(profile, (str, Path)):
+                trace.save(profile)
+                print(f"Profile trace saved to {profile}")
+    return len(pending)
+
+
+def get_poses(args) -> PoseTable:
+    """
+    The run's pose table: loaded from --poses, sampled with --sample, or the Cartesian
+    product of the per-axis values (yaw -45, 0, 45 by default).
+    """
+    if args.poses:
+        return PoseTable.from_file(args.poses)
+    axes = {field: getattr(args, field) for field in ("yaw", "pitch", "roll", "tx", "ty", "tz")}
+    if args.sample:
+        ranges = {field: (min(values), max(values)) for field, values in axes.items()}
+        return PoseTable.random(args.sample, seed=args.seed, **ranges)
+    return PoseTable.grid(**axes)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate rotated-camera 2D datasets from KITTI")
+    parser.add_argument("--kitti-path", default=None, help="KITTI object root, defaults to $KITTI_PATH")
+    parser.add_argument("--packed", default=None, help="read frames from a pack_kitti directory instead")
+    parser.add_argument("--output", default="datasets", help="output root for dataset_{i} directories")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--start", type=int, default=0, help="first frame index")
+    parser.add_argument("--end", type=int, default=None, help="last frame index (exclusive), defaults to all frames")
+    parser.add_argument("--poses", default=None, help="pose table file (.csv with a yaw,pitch,roll,tx,ty,tz header, or .json)")
+    parser.add_argument("--yaw", type=float, nargs="+", default=[-45, 0, 45], help="yaw angles of the pose grid [deg]")
+    parser.add_argument("--pitch", type=float, nargs="+", default=[0], help="pitch angles of the pose grid [deg]")
+    parser.add_argument("--roll", type=float, nargs="+", default=[0], help="roll angles of the pose grid [deg]")
+    parser.add_argument("--tx", type=float, nargs="+", default=[0], help="x translations of the pose grid")
+    parser.add_argument("--ty", type=float, nargs="+", default=[0], help="y translations of the pose grid")
+    parser.add_argument("--tz", type=float, nargs="+", default=[0], help="z translations of the pose grid")
+    parser.add_argument("--sample", type=int, default=0,
+                        help="draw this many random poses within each axis' [min, max] instead of the full grid")
+    parser.add_argument("--seed", type=int, default=0, help="seed of --sample")
+    parser.add_argument("--no-resume", action="store_true", help="regenerate frames whose outputs are current")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report which outputs are missing or stale and would be generated")
+    parser.add_argument("--prefetch", type=int, default=0,
+                        help="frames to read ahead per worker through the streaming pipeline, 0 disables it")
+    parser.add_argument("--io-threads", type=int, default=4, help="reader and writer threads per worker pipeline")
+    parser.add_argument("--spatial-index", action="store_true",
+                        help="index each sweep by azimuth so every pose projects only its field of view, "
+                             "pays off from about ten poses per frame")
+    parser.add_argument("--dtype", default=None, choices=["float32", "float64"],
+                        help="projection compute dtype, defaults to the point cloud's (float32)")
+    parser.add_argument("--bev", action="store_true",
+                        help="also write bird's-eye-view grids (occupancy, height, intensity, density) and OBB labels")
+    parser.add_argument("--bev-resolution", type=float, default=0.1, help="BEV cell size in meters")
+    parser.add_argument("--range-image", action="store_true", help="also write spherical range images")
+    parser.add_argument("--range-width", type=int, default=1024, help="range image columns (full azimuth)")
+    parser.add_argument("--cameras", nargs="+", default=["P2"], choices=CAMERAS,
+                        help="KITTI cameras to render from every pose, all but P2 into dataset_{i}_{camera}")
+    parser.add_argument("--min-visible", type=float, default=None,
+                        help="clip 2D boxes to the image and drop off-screen boxes and boxes whose visible "
+                             "fraction against the lidar depth buffer is below this (0 only clips)")
+    parser.add_argument("--occlusion-cell", type=int, default=4, help="depth buffer cell size in pixels")
+    parser.add_argument("--voxel-size", type=float, default=0,
+                        help="downsample every sweep to one point per voxel of this size in meters before "
+                             "projecting it, 0 keeps every point")
+    parser.add_argument("--voxel-reduce", default="mean", choices=REDUCTIONS,
+                        help="point kept per voxel: the centroid, or the point nearest to the sensor")
+    parser.add_argument("--lod-distance", type=float, default=None,
+                        help="double the voxel size at every doubling of the range beyond this many meters")
+    parser.add_argument("--label-precision", type=int, default=6, help="decimals of the YOLO label values")
+    parser.add_argument("--label-shards", action="store_true",
+                        help="also collect the labels into one shard_<frame>.npz per pose and worker chunk")
+    parser.add_argument("--no-label-txt", action="store_true",
+                        help="skip the per-frame label text files, only write shards (implies --label-shards)")
+    parser.add_argument("--image-shards", default=None, choices=["png", "jpg", "points"],
+                        help="pack images into one tar shard per pose and worker chunk in this encoding, "
+                             "or store the visible (u, v, depth) points to re-render later")
+    parser.add_argument("--jpeg-quality", type=int, default=95, help="JPEG quality of --image-shards jpg")
+    parser.add_argument("--point-radius", type=int, default=0, help="rendered point radius in pixels")
+    parser.add_argument("--alpha", type=float, default=0.3, help="rendered point opacity")
+    parser.add_argument("--colormap", default="jet", help="depth colormap name")
+    parser.add_argument("--profile", nargs="?", const=True, default=None, metavar="TRACE",
+                        help="time every stage and print a summary, optionally saving the trace to a .json or .csv path")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
     load_dotenv(dotenv_path=".env")
+    args = parse_args()
+
+    if args.packed:
+        source = KITTIDataset(args.packed)
+        print(args.packed)
+    else:
+        KITTI_PATH = args.kitti_path or os.environ.get("KITTI_PATH")
+        print(KITTI_PATH)
+        source = KITTIPaths(KITTI_PATH)
+
+    poses = get_poses(args)
+    print(f"{len(poses)} poses")
+
+    pipeline_options = None
+    if args.prefetch > 0:
+        pipeline_options = dict(read_workers=args.io_threads, write_workers=args.io_threads, prefetch=args.prefetch)
+    render_options = dict(radius=args.point_radius, alpha=args.alpha, lut=get_colormap_lut(args.colormap))
+
+    lidar_views = {}
+    if args.bev:
+        lidar_views["bev"] = BEVGrid(resolution=args.bev_resolution)
+    if args.range_image:
+        lidar_views["range"] = RangeImage(width=args.range_width)
+
+    label_options = dict(
+        precision=args.label_precision, text=not args.no_label_txt, shards=args.label_shards or args.no_label_txt)
+
+    image_options = None
+    if args.image_shards:
+        image_options = dict(fmt=args.image_shards, jpeg_quality=args.jpeg_quality, encode_workers=args.io_threads)
+
+    visibility = None
+    if args.min_visible is not None:
+        visibility = VisibilityFilter(min_visible=args.min_visible, cell_size=args.occlusion_cell)
+
+    decimator = None
+    if args.voxel_size > 0:
+        decimator = VoxelDecimator(args.voxel_size, reduce=args.voxel_reduce, lod_distance=args.lod_distance)
 
-    KITTI_PATH = os.environ.get("KITTI_PATH")
-    print(KITTI_PATH)
-    file = "000000"
-
-    # Paths
-    calib_dir_path = Path(KITTI_PATH)/"calib"
-    vel_dir_path   = Path(KITTI_PATH)/"velodyne"
-    img_dir_path   = Path(KITTI_PATH)/"image_2"
-    label_dir_path = Path(KITTI_PATH)/"label_2"
-
-    # Angles
-    yaw_angles =      [-45        ,0      ,45]
-    pitch_angles =    [0        ,0      ,0]    
-    roll_angles =     [0        ,0      ,0]   
-    # Transform
-    tx_s =            [0        ,0      ,0]   
-    ty_s =            [0        ,0      ,0]   
-    tz_s =            [0        ,0      ,0]   
-
-    for i in tqdm(range(7481)):
-        file_name = f"{i:06d}"
-        create_file_variants(file=file_name)
-    print("Datasets saved successfully.")
+    frame_ids = source.frame_ids()[args.start:args.end]
+    generate_datasets(
+        source, poses, output_dir=args.output, frame_ids=frame_ids,
+        workers=args.workers, resume=not args.no_resume,
+        render_options=render_options, pipeline_options=pipeline_options, spatial_index=args.spatial_index,
+        profile=args.profile, dtype=args.dtype, lidar_views=lidar_views,
+        label_options=label_options, image_options=image_options, dry_run=args.dry_run, visibility=visibility,
+        cameras=args.cameras, decimator=decimator)
+    if not args.dry_run:
+        print("Datasets saved successfully.")
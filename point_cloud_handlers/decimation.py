@@ -0,0 +1,85 @@
+import numpy as np
+
+from point_cloud_handlers.profiling import profiler, timed
+
+REDUCTIONS = ("mean", "nearest")
+
+# Voxel coordinates and the LOD level packed into one int64 key: 3 x 20 bits + 3 bits
+_COORD_BITS = 20
+_COORD_MIN, _COORD_MAX = -(1 << (_COORD_BITS - 1)), (1 << (_COORD_BITS - 1)) - 1
+_MAX_LEVEL = 7
+
+
+def voxel_keys(xyz, voxel_size, lod_distance=None):
+    """
+    Hash key of every point's voxel.
+    With lod_distance, points farther than it from the sensor fall into coarser voxels: level
+    floor(log2(range / lod_distance)) + 1, each level doubling the voxel size, so the voxels
+    keep roughly the same size in pixels as they recede.
+    Args:
+        xyz: (N, 3) velodyne coordinates
+    Returns:
+        keys: (N,) int64 voxel keys, equal for points sharing a voxel
+        dist: (N,) range of every point from the sensor
+    """
+    dist = np.sqrt(np.einsum('ij,ij->i', xyz, xyz))
+    scale = np.full(len(xyz), 1.0 / voxel_size, dtype=xyz.dtype)
+    level = None
+    if lod_distance:
+        with np.errstate(divide="ignore"):
+            level = np.floor(np.log2(dist / lod_distance)) + 1
+        level = np.clip(level, 0, _MAX_LEVEL).astype(np.int64)
+        scale /= np.left_shift(1, level).astype(xyz.dtype)
+    coords = np.floor(xyz * scale[:, None]).astype(np.int64)
+    np.clip(coords, _COORD_MIN, _COORD_MAX, out=coords)
+    coords -= _COORD_MIN
+    keys = (coords[:, 0] << (2 * _COORD_BITS)) | (coords[:, 1] << _COORD_BITS) | coords[:, 2]
+    if level is not None:
+        keys |= level << (3 * _COORD_BITS)
+    return keys, dist
+
+
+class VoxelDecimator:
+    """
+    Voxel-grid downsampling of a velodyne sweep, run once per frame ahead of the projection so
+    every pose and camera of the frame projects and renders the same reduced cloud.
+
+    Points are hashed into voxel_size cubes (coarser with distance, see voxel_keys) and every
+    occupied voxel keeps one point:
+        mean      the centroid of its points and their mean reflectance
+        nearest   its point nearest to the sensor, an original point of the sweep; the range
+                  from the sensor stands in for the depth, which differs per pose
+    """
+    def __init__(self, voxel_size=0.1, reduce="mean", lod_distance=None):
+        if reduce not in REDUCTIONS:
+            raise ValueError(f"unknown reduction {reduce!r}, expected one of {REDUCTIONS}")
+        self.voxel_size = voxel_size
+        self.reduce = reduce
+        self.lod_distance = lod_distance
+
+    @timed("decimate")
+    def __call__(self, lidar_points):
+        """
+        Args:
+            lidar_points: (N, >=3) lidar array
+        Returns:
+            points: (V, C) decimated cloud with the input's columns and dtype, V <= N
+        """
+        if not self.voxel_size or not len(lidar_points):
+            return lidar_points
+        keys, dist = voxel_keys(lidar_points[:, :3], self.voxel_size, self.lod_distance)
+        if self.reduce == "nearest":
+            # np.unique returns the first occurrence of every key, with the points ordered
+            # nearest first that is the nearest point of its voxel
+            order = np.argsort(dist)
+            _, first = np.unique(keys[order], return_index=True)
+            # Sorted back into sweep order, so the output is a plain subset of the input
+            points = lidar_points[np.sort(order[first])]
+        else:
+            _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+            inverse = inverse.ravel()
+            points = np.empty((len(counts), lidar_points.shape[1]), dtype=lidar_points.dtype)
+            for column in range(lidar_points.shape[1]):
+                points[:, column] = np.bincount(inverse, weights=lidar_points[:, column], minlength=len(counts)) / counts
+        profiler.count("points_decimated", len(lidar_points) - len(points))
+        return points
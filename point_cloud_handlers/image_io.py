@@ -0,0 +1,80 @@
+import struct
+from pathlib import Path
+
+import numpy as np
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Decoded image shape per file, and per directory for sequences known to share one size
+_shape_cache = {}
+_sequence_shape_cache = {}
+
+
+def read_png_size(path):
+    """
+    Returns (height, width) from the PNG IHDR chunk without decoding any pixels,
+    or None if the file is not a PNG.
+    """
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if len(header) < 24 or header[:8] != _PNG_SIGNATURE or header[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", header[16:24])
+    return height, width
+
+
+def read_image_shape(path, uniform_sequence=False) -> tuple:
+    """
+    Shape of the image cv2.imread would return (always 3 channels in color mode).
+    With uniform_sequence, every image in the same directory is assumed to share
+    the first one's size, as within a KITTI raw/tracking sequence.
+    """
+    path = Path(path)
+    if uniform_sequence and path.parent in _sequence_shape_cache:
+        return _sequence_shape_cache[path.parent]
+
+    shape = _shape_cache.get(path)
+    if shape is None:
+        size = read_png_size(path)
+        if size is None:
+            import cv2
+
+            size = cv2.imread(str(path)).shape[:2]
+        shape = (*size, 3)
+        _shape_cache[path] = shape
+
+    if uniform_sequence:
+        _sequence_shape_cache[path.parent] = shape
+    return shape
+
+
+class LazyImage:
+    """
+    RGB image handle that knows its shape from the file header and decodes pixels
+    only when .data (or np.asarray) is used.
+    """
+    def __init__(self, path, uniform_sequence=False):
+        self.path = Path(path)
+        self.uniform_sequence = uniform_sequence
+        self._shape = None
+        self._data = None
+
+    @property
+    def shape(self) -> tuple:
+        if self._data is not None:
+            return self._data.shape
+        if self._shape is None:
+            self._shape = read_image_shape(self.path, self.uniform_sequence)
+        return self._shape
+
+    @property
+    def data(self) -> np.ndarray:
+        if self._data is None:
+            import cv2
+
+            image = cv2.imread(str(self.path))
+            self._data = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return self._data
+
+    def __array__(self, dtype=None, copy=None):
+        return self.data if dtype is None else self.data.astype(dtype)
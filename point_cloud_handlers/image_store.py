@@ -0,0 +1,194 @@
+import io
+import json
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from point_cloud_handlers.label_writer import create_shard_file
+from point_cloud_handlers.profiling import profiler
+from point_cloud_handlers.rasterizer import rasterize_points
+
+IMAGE_FORMATS = ("png", "jpg", "points")
+
+
+def encode_image(canvas, fmt="png", jpeg_quality=95) -> bytes:
+    """Encodes an RGB canvas as PNG or JPEG bytes."""
+    import cv2
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if fmt == "jpg" else []
+    ok, data = cv2.imencode(f".{fmt}", cv2.cvtColor(canvas, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return data.tobytes()
+
+
+def decode_image(data) -> np.ndarray:
+    """Decodes PNG or JPEG bytes into an RGB array."""
+    import cv2
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class ImageShardWriter:
+    """
+    Packs the rendered images of a sweep of poses into shards instead of one file per frame and pose.
+
+    For "png" and "jpg", add() submits the encoding to a thread pool (cv2 releases the GIL) and
+    flush() writes a new image_dir/shard_<first frame>[_<n>].tar per pose, a WebDataset-style tar
+    of <frame>.<fmt> members, next to a .json index of their data offsets with the same name.
+
+    For "points", nothing is rasterized: add_points() keeps the visible (u, v, depth) of each
+    frame and flush() writes a new image_dir/points_<first frame>[_<n>].npz. Pixel coordinates
+    are stored as uint16 and depth as float32, which is all rasterize_points uses, so
+    ImageShardIndex re-renders the exact image.
+
+    Existing shards are never replaced, see create_shard_file.
+    """
+    def __init__(self, image_dirs, fmt="png", jpeg_quality=95, encode_workers=2):
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format {fmt}, expected one of {IMAGE_FORMATS}")
+        self.image_dirs = [Path(image_dir) for image_dir in image_dirs]
+        self.fmt = fmt
+        self.jpeg_quality = jpeg_quality
+        self._pending = [[] for _ in self.image_dirs]
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(encode_workers) if fmt != "points" else None
+
+    def add(self, file, pose_index, canvas):
+        """Queues the (H, W, 3) RGB canvas of one frame for one pose."""
+        future = self._pool.submit(encode_image, canvas, self.fmt, self.jpeg_quality)
+        with self._lock:
+            self._pending[pose_index].append((file, future))
+
+    def add_points(self, file, pose_index, img_pts, depth, image_shape):
+        """Queues the visible projected points of one frame for one pose, in drawing order."""
+        with self._lock:
+            self._pending[pose_index].append((file, (img_pts.astype(np.uint16), depth.astype(np.float32), image_shape)))
+
+    def flush(self):
+        """Writes one shard per pose from everything added since the last flush."""
+        with self._lock:
+            pending, self._pending = self._pending, [[] for _ in self.image_dirs]
+        for image_dir, entries in zip(self.image_dirs, pending):
+            if not entries:
+                continue
+            entries.sort(key=lambda entry: entry[0])
+            if self.fmt == "points":
+                paths = _write_points_shard(image_dir, entries)
+            else:
+                paths = _write_tar_shard(image_dir, [(file, future.result()) for file, future in entries], self.fmt)
+            if profiler.enabled:
+                profiler.count("bytes_written", sum(path.stat().st_size for path in paths))
+
+    def close(self):
+        self.flush()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _write_tar_shard(image_dir, entries, fmt):
+    tar_path = create_shard_file(image_dir, f"shard_{entries[0][0]}", ".tar")
+    index = {}
+    with tarfile.open(tar_path, "w", format=tarfile.USTAR_FORMAT) as tar:
+        for file, data in entries:
+            info = tarfile.TarInfo(f"{file}.{fmt}")
+            info.size = len(data)
+            header = info.tobuf(tar.format, tar.encoding, tar.errors)
+            index[file] = [tar.offset + len(header), len(data)]
+            tar.addfile(info, io.BytesIO(data))
+    index_path = tar_path.with_suffix(".json")
+    with open(index_path, "w") as f:
+        json.dump({"format": fmt, "frames": index}, f)
+    return tar_path, index_path
+
+
+def _write_points_shard(image_dir, entries):
+    path = create_shard_file(image_dir, f"points_{entries[0][0]}", ".npz")
+    counts = [len(depth) for _, (_, depth, _) in entries]
+    np.savez_compressed(
+        path,
+        frame_ids=np.array([file for file, _ in entries]),
+        offsets=np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        uv=np.concatenate([uv for _, (uv, _, _) in entries]).reshape(-1, 2),
+        depth=np.concatenate([depth for _, (_, depth, _) in entries]),
+        image_shapes=np.array([shape for _, (_, _, shape) in entries], dtype=np.int32).reshape(-1, 3),
+    )
+    return (path,)
+
+
+class ImageShardIndex:
+    """
+    Frame id lookup over all the image shards of one pose directory, tar and point shards alike.
+    A frame written again by a later run is served from the most recently written shard, the
+    others from the shards that still hold them.
+    Only the frame ids of the point shards are read up front. A shard's points are loaded on
+    the first get_points of one of its frames and kept until a frame of another shard is read,
+    so reading the frames in order holds one shard in memory.
+    """
+    def __init__(self, image_dir):
+        image_dir = Path(image_dir)
+        self._index = {}
+        self._points = []
+        self._loaded = (None, None)
+        shards = list(image_dir.glob("shard_*.json")) + list(image_dir.glob("points_*.npz"))
+        for path in sorted(shards, key=lambda path: path.stat().st_mtime_ns):
+            if path.suffix == ".json":
+                with open(path) as f:
+                    meta = json.load(f)
+                tar_path = path.with_suffix(".tar")
+                for file, (offset, size) in meta["frames"].items():
+                    self._index[file] = ("tar", tar_path, offset, size)
+            else:
+                with np.load(path) as shard:
+                    frame_ids = shard["frame_ids"].tolist()
+                for row, file in enumerate(frame_ids):
+                    self._index[file] = ("points", len(self._points), row)
+                self._points.append(path)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, file):
+        return file in self._index
+
+    def frame_ids(self):
+        return sorted(self._index)
+
+    def read_bytes(self, file) -> bytes:
+        """Encoded PNG/JPEG bytes of a frame stored in a tar shard."""
+        kind, tar_path, offset, size = self._index[file]
+        with open(tar_path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def get_points(self, file):
+        """Returns (uv (P, 2) uint16, depth (P,) float32, image_shape) of a frame stored as points."""
+        kind, shard, row = self._index[file]
+        loaded, data = self._loaded
+        if loaded != shard:
+            with np.load(self._points[shard]) as npz:
+                data = {key: npz[key] for key in ("offsets", "uv", "depth", "image_shapes")}
+            self._loaded = shard, data
+        start, stop = data["offsets"][row:row + 2]
+        return data["uv"][start:stop], data["depth"][start:stop], tuple(data["image_shapes"][row])
+
+    def __getitem__(self, file) -> np.ndarray:
+        """
+        The (H, W, 3) RGB image of a frame, decoded from its tar shard or re-rendered from
+        its points; use get_points with rasterize_points for other render options.
+        """
+        if self._index[file][0] == "tar":
+            return decode_image(self.read_bytes(file))
+        uv, depth, image_shape = self.get_points(file)
+        return rasterize_points(uv, depth, image_shape)
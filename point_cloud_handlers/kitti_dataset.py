@@ -0,0 +1,206 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from point_cloud_handlers.calibration import KITTICalibration, load_calibration
+from point_cloud_handlers.image_io import read_image_shape
+from point_cloud_handlers.labels_handler import LABEL_DTYPE, KITTILabelHandler
+from point_cloud_handlers.profiling import profiler, timed
+
+# Calibration entries kept in a packed dataset, with their matrix shapes
+CALIB_KEYS = {
+    'P0': (3, 4), 'P1': (3, 4), 'P2': (3, 4), 'P3': (3, 4),
+    'R0_rect': (3, 3), 'Tr_velo_to_cam': (3, 4), 'Tr_imu_to_velo': (3, 4),
+}
+CALIB_DTYPE = np.dtype([(key, np.float64, shape) for key, shape in CALIB_KEYS.items()])
+
+
+class KITTIPaths:
+    def __init__(self, kitti_path):
+        root = Path(kitti_path)
+        self.calib_dir = root / "calib"
+        self.vel_dir = root / "velodyne"
+        self.img_dir = root / "image_2"
+        self.label_dir = root / "label_2"
+
+    def frame_ids(self):
+        return sorted(path.stem for path in self.vel_dir.glob("*.bin"))
+
+    def image_path(self, file):
+        return self.img_dir / f"{file}.png"
+
+    def velodyne_path(self, file):
+        return self.vel_dir / f"{file}.bin"
+
+    def calib_path(self, file):
+        return self.calib_dir / f"{file}.txt"
+
+    def label_path(self, file):
+        return self.label_dir / f"{file}.txt"
+
+    def input_paths(self, file):
+        """The files a frame's outputs are generated from."""
+        return self.calib_path(file), self.label_path(file), self.velodyne_path(file)
+
+    @timed("load")
+    def load_frame(self, file):
+        """
+        Returns (image_shape, lidar, calib, label_handler) read from the raw KITTI files.
+        """
+        image_shape = read_image_shape(self.image_path(file))
+        lidar = read_velodyne(self.velodyne_path(file))
+        calib = load_calibration(self.calib_path(file))
+        label_handler = KITTILabelHandler(self.label_path(file))
+        return image_shape, lidar, calib, label_handler
+
+
+@timed("load.velodyne")
+def read_velodyne(path) -> np.ndarray:
+    points = np.fromfile(path, dtype=np.float32)
+    profiler.count("bytes_read", points.nbytes)
+    return points.reshape(-1, 4)
+
+
+def pack_kitti(paths: KITTIPaths, output_dir, frame_ids=None):
+    """
+    One-time conversion of a KITTI object split into contiguous arrays:
+        points.bin          every velodyne sweep back to back, float32 (x, y, z, r)
+        point_offsets.npy   (F + 1,) row offsets of each frame into points.bin
+        calib.npy           (F,) CALIB_DTYPE records
+        labels.npy          LABEL_DTYPE records of all frames, DontCare dropped
+        label_offsets.npy   (F + 1,) row offsets of each frame into labels.npy
+        image_shapes.npy    (F, 3) source image shapes
+        meta.json           frame ids
+    Returns the output directory.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    frame_ids = paths.frame_ids() if frame_ids is None else list(frame_ids)
+
+    point_offsets = np.zeros(len(frame_ids) + 1, dtype=np.int64)
+    label_offsets = np.zeros(len(frame_ids) + 1, dtype=np.int64)
+    calibs = np.zeros(len(frame_ids), dtype=CALIB_DTYPE)
+    image_shapes = np.zeros((len(frame_ids), 3), dtype=np.int32)
+    labels = []
+
+    with open(output_dir / "points.bin", "wb") as points_file:
+        for i, file in enumerate(frame_ids):
+            image_shape, lidar, calib, label_handler = paths.load_frame(file)
+            points_file.write(np.ascontiguousarray(lidar, dtype=np.float32).tobytes())
+            point_offsets[i + 1] = point_offsets[i] + len(lidar)
+
+            for key, shape in CALIB_KEYS.items():
+                if key in calib.calib:
+                    calibs[i][key] = calib.calib[key].reshape(shape)
+
+            labels.append(label_handler.objects)
+            label_offsets[i + 1] = label_offsets[i] + len(label_handler.objects)
+            image_shapes[i] = image_shape
+
+    np.save(output_dir / "point_offsets.npy", point_offsets)
+    np.save(output_dir / "label_offsets.npy", label_offsets)
+    np.save(output_dir / "calib.npy", calibs)
+    np.save(output_dir / "labels.npy", np.concatenate(labels) if labels else np.zeros(0, dtype=LABEL_DTYPE))
+    np.save(output_dir / "image_shapes.npy", image_shapes)
+    with open(output_dir / "meta.json", "w") as f:
+        json.dump({"frame_ids": frame_ids}, f)
+    return output_dir
+
+
+class KITTIDataset:
+    """
+    Reader for a pack_kitti directory. Arrays are memory-mapped and opened lazily,
+    so instances are cheap to pickle into worker processes.
+    """
+    def __init__(self, pack_dir):
+        self.pack_dir = Path(pack_dir)
+        with open(self.pack_dir / "meta.json") as f:
+            self._frame_ids = json.load(f)["frame_ids"]
+        self._index = {file: i for i, file in enumerate(self._frame_ids)}
+        self._arrays = None
+        # Frames with identical calibration records share one KITTICalibration
+        self._calibs = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        state["_calibs"] = {}
+        return state
+
+    def _open(self):
+        if self._arrays is None:
+            load = lambda name: np.load(self.pack_dir / name, mmap_mode='r')
+            self._arrays = {
+                "points": np.memmap(self.pack_dir / "points.bin", dtype=np.float32, mode='r').reshape(-1, 4),
+                "point_offsets": load("point_offsets.npy"),
+                "label_offsets": load("label_offsets.npy"),
+                "calib": load("calib.npy"),
+                "labels": load("labels.npy"),
+                "image_shapes": load("image_shapes.npy"),
+            }
+        return self._arrays
+
+    def __len__(self):
+        return len(self._frame_ids)
+
+    def frame_ids(self):
+        return list(self._frame_ids)
+
+    def index_of(self, file):
+        return self._index[file]
+
+    def get_lidar(self, i) -> np.ndarray:
+        """Zero-copy (N, 4) view into the point-cloud blob."""
+        arrays = self._open()
+        start, stop = arrays["point_offsets"][i:i + 2]
+        return arrays["points"][start:stop]
+
+    def get_calib(self, i) -> KITTICalibration:
+        record = self._open()["calib"][i]
+        key = record.tobytes()
+        calib = self._calibs.get(key)
+        if calib is None:
+            calib = KITTICalibration.from_dict({name: record[name].ravel() for name in CALIB_KEYS})
+            self._calibs[key] = calib
+        return calib
+
+    def get_labels(self, i) -> KITTILabelHandler:
+        arrays = self._open()
+        start, stop = arrays["label_offsets"][i:i + 2]
+        return KITTILabelHandler.from_array(arrays["labels"][start:stop])
+
+    def get_image_shape(self, i) -> tuple:
+        return tuple(int(v) for v in self._open()["image_shapes"][i])
+
+    def frame_digest(self, file) -> str:
+        """Content digest of a frame's point cloud, calibration record and labels."""
+        i = self.index_of(file)
+        arrays = self._open()
+        h = hashlib.blake2b(digest_size=16)
+        h.update(np.ascontiguousarray(self.get_lidar(i)).data)
+        h.update(arrays["calib"][i].tobytes())
+        start, stop = arrays["label_offsets"][i:i + 2]
+        h.update(np.ascontiguousarray(arrays["labels"][start:stop]).data)
+        return h.hexdigest()
+
+    @timed("load")
+    def load_frame(self, file):
+        """
+        Same contract as KITTIPaths.load_frame, served from the packed arrays.
+        """
+        i = self.index_of(file)
+        return self.get_image_shape(i), self.get_lidar(i), self.get_calib(i), self.get_labels(i)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack a KITTI object split into memory-mappable arrays")
+    parser.add_argument("--kitti-path", required=True, help="KITTI object root (calib, velodyne, image_2, label_2)")
+    parser.add_argument("--output", required=True, help="output directory of the packed dataset")
+    args = parser.parse_args()
+
+    pack_kitti(KITTIPaths(args.kitti_path), args.output)
+    print(f"Packed dataset saved to {args.output}")
@@ -0,0 +1,171 @@
+import queue
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from point_cloud_handlers.profiling import profiler
+from point_cloud_handlers.yolo_adapter import format_yolo_rows
+
+_DONE = object()
+
+
+class YOLOLabelWriter:
+    """
+    Buffered YOLO label output for a sweep of poses.
+
+    add() only hands the rows over: a background thread formats them at a fixed precision
+    and writes the per-frame text files, so the caller never waits on the filesystem.
+    With shards, the rows of every pose are also collected in memory and flush() writes
+    them as one new label_dir/shard_<first frame>[_<n>].npz per pose, indexed by frame id (see
+    LabelShardIndex). With text=False the shards are the only label output, which avoids
+    one small file per frame and pose altogether.
+    """
+    def __init__(self, label_dirs, precision=6, text=True, shards=False, queue_size=256):
+        self.label_dirs = [Path(label_dir) for label_dir in label_dirs]
+        self.precision = precision
+        self.text = text
+        self.shards = shards
+        self._shard_rows = [[] for _ in self.label_dirs]
+        self._lock = threading.Lock()
+        self._errors = []
+        self._queue = None
+        self._thread = None
+        if text:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._write_loop, daemon=True)
+            self._thread.start()
+
+    def _write_loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _DONE:
+                    return
+                if not self._errors:
+                    path, class_ids, boxes = job
+                    with profiler.stage("write.labels"):
+                        data = format_yolo_rows(class_ids, boxes, self.precision).encode()
+                        with open(path, "wb") as f:
+                            f.write(data)
+                    profiler.count("bytes_written", len(data))
+            except BaseException as e:
+                self._errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._errors:
+            raise self._errors[0]
+
+    def add(self, file, pose_index, class_ids, boxes):
+        """
+        Queues the labels of one frame for one pose.
+        Args:
+            class_ids: (M,) int class ids
+            boxes: (M, 4) normalized YOLO boxes, e.g. from rects_to_yolo_array
+        """
+        self._check()
+        if self.text:
+            self._queue.put((self.label_dirs[pose_index] / f"{file}.txt", class_ids, boxes))
+        if self.shards:
+            with self._lock:
+                self._shard_rows[pose_index].append((file, class_ids, boxes))
+
+    def flush(self):
+        """Waits until every queued text file is written, then writes the pending shards."""
+        if self.text:
+            self._queue.join()
+        self._check()
+        if not self.shards:
+            return
+        with self._lock:
+            pending, self._shard_rows = self._shard_rows, [[] for _ in self.label_dirs]
+        for label_dir, rows in zip(self.label_dirs, pending):
+            if rows:
+                with profiler.stage("write.labels"):
+                    path = write_label_shard(label_dir, rows)
+                profiler.count("bytes_written", path.stat().st_size)
+
+    def close(self):
+        self.flush()
+        if self._thread is not None:
+            self._queue.put(_DONE)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def create_shard_file(directory, stem, suffix) -> Path:
+    """
+    Creates an empty directory/<stem><suffix>, or <stem>_<n><suffix> with the first free n, and
+    returns its path. Existing shards are never replaced: they can hold frames a later (partial)
+    run did not regenerate, and several workers may be flushing into the same directory.
+    """
+    n = 0
+    while True:
+        path = Path(directory) / (f"{stem}_{n}{suffix}" if n else f"{stem}{suffix}")
+        try:
+            open(path, "xb").close()
+            return path
+        except FileExistsError:
+            n += 1
+
+
+def write_label_shard(label_dir, rows) -> Path:
+    """
+    Writes (frame id, class_ids, boxes) rows as a new label_dir/shard_<first frame id>[_<n>].npz
+    (see create_shard_file) with
+        frame_ids   (F,) frame ids, sorted
+        offsets     (F + 1,) row offsets of each frame into class_id and boxes
+        class_id    (M,) int16
+        boxes       (M, 4) float32 normalized YOLO boxes
+    Returns the shard path.
+    """
+    rows = sorted(rows, key=lambda row: row[0])
+    counts = [len(class_ids) for _, class_ids, _ in rows]
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    class_id = np.concatenate([np.asarray(c, dtype=np.int16) for _, c, _ in rows])
+    boxes = np.concatenate([np.asarray(b, dtype=np.float32).reshape(-1, 4) for _, _, b in rows])
+    path = create_shard_file(label_dir, f"shard_{rows[0][0]}", ".npz")
+    np.savez(path, frame_ids=np.array([file for file, _, _ in rows]), offsets=offsets, class_id=class_id, boxes=boxes)
+    return path
+
+
+class LabelShardIndex:
+    """
+    Frame id lookup over all the label shards of one pose directory. A frame written again by a
+    later run is served from the most recently written shard, the others from the shards that
+    still hold them.
+    """
+    def __init__(self, label_dir):
+        self._shards = []
+        self._index = {}
+        for path in sorted(Path(label_dir).glob("shard_*.npz"), key=lambda path: path.stat().st_mtime_ns):
+            with np.load(path) as shard:
+                data = {key: shard[key] for key in ("frame_ids", "offsets", "class_id", "boxes")}
+            for row, file in enumerate(data["frame_ids"].tolist()):
+                self._index[file] = (len(self._shards), row)
+            self._shards.append(data)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, file):
+        return file in self._index
+
+    def frame_ids(self):
+        return sorted(self._index)
+
+    def __getitem__(self, file):
+        """Returns (class_ids (M,), boxes (M, 4)) of a frame."""
+        shard, row = self._index[file]
+        data = self._shards[shard]
+        start, stop = data["offsets"][row:row + 2]
+        return data["class_id"][start:stop], data["boxes"][start:stop]
@@ -2,39 +2,102 @@ import numpy as np
 
 from point_cloud_handlers.base_kitti_handler import KITTIHandlerBase
 from point_cloud_handlers.calibration import KITTICalibration
+from point_cloud_handlers.profiling import profiler, timed
+
+KITTI_TYPES = ('Car', 'Van', 'Truck', 'Pedestrian', 'Person_sitting', 'Cyclist', 'Tram', 'Misc')
+KITTI_TYPE_TO_ID = {name: i for i, name in enumerate(KITTI_TYPES)}
+
+# One row per object, all 15 KITTI label columns (type stored as an index into KITTI_TYPES, -1 if unknown)
+LABEL_DTYPE = np.dtype([
+    ('type_id', np.int16),
+    ('truncated', np.float32),
+    ('occluded', np.int8),
+    ('alpha', np.float32),
+    ('bbox', np.float32, (4,)),
+    ('h', np.float64), ('w', np.float64), ('l', np.float64),
+    ('x', np.float64), ('y', np.float64), ('z', np.float64),
+    ('ry', np.float64),
+])
+
+# Unit box corners, same order as compute_box_3d: x along l, y along -h, z along w
+_UNIT_CORNERS = np.array([
+    [ 0.5,  0.5, -0.5, -0.5,  0.5,  0.5, -0.5, -0.5],
+    [   0,    0,    0,    0,   -1,   -1,   -1,   -1],
+    [ 0.5, -0.5, -0.5,  0.5,  0.5, -0.5, -0.5,  0.5],
+]).T                                                            # (8, 3)
+
 
 class KITTILabelHandler(KITTIHandlerBase):
     def __init__(self, label_file):
         self.label_file = label_file
-        self.labels = self._read_labels()
+        self.objects = self._read_labels()
+
+    @classmethod
+    def from_array(cls, objects: np.ndarray, label_file=None):
+        """
+        Wraps an existing LABEL_DTYPE array, e.g. a slice of a packed dataset, without reading a file.
+        """
+        obj = cls.__new__(cls)
+        obj.label_file = label_file
+        obj.objects = objects
+        return obj
 
+    @timed("load.labels")
     def _read_labels(self):
-        labels = []
         with open(self.label_file, 'r') as f:
-            for line in f.readlines():
-                parts = line.strip().split(' ')
-                obj_type = parts[0]
-                if obj_type == 'DontCare':
-                    continue
-                label = {
-                    'type': obj_type,
-                    'h': float(parts[8]),
-                    'w': float(parts[9]),
-                    'l': float(parts[10]),
-                    'x': float(parts[11]),
-                    'y': float(parts[12]),
-                    'z': float(parts[13]),
-                    'ry': float(parts[14])
-                }
-                labels.append(label)
-        return labels
+            text = f.read()
+        profiler.count("bytes_read", len(text))
+        rows = [line.split() for line in text.splitlines()]
+        rows = [parts for parts in rows if parts and parts[0] != 'DontCare']
+
+        objects = np.zeros(len(rows), dtype=LABEL_DTYPE)
+        if not rows:
+            return objects
+        values = np.array([parts[1:15] for parts in rows], dtype=np.float64)
+        objects['type_id'] = [KITTI_TYPE_TO_ID.get(parts[0], -1) for parts in rows]
+        objects['truncated'] = values[:, 0]
+        objects['occluded'] = values[:, 1]
+        objects['alpha'] = values[:, 2]
+        objects['bbox'] = values[:, 3:7]
+        for i, field in enumerate(('h', 'w', 'l', 'x', 'y', 'z', 'ry')):
+            objects[field] = values[:, 7 + i]
+        return objects
+
+    @property
+    def types(self):
+        return [KITTI_TYPES[i] if i >= 0 else 'Unknown' for i in self.objects['type_id']]
+
+    @property
+    def labels(self):
+        """Per-object dicts, kept for callers of the original list-of-dicts interface."""
+        fields = ('h', 'w', 'l', 'x', 'y', 'z', 'ry')
+        return [
+            {'type': obj_type, **{field: float(obj[field]) for field in fields}}
+            for obj_type, obj in zip(self.types, self.objects)
+        ]
+
+    def compute_boxes_3d(self):
+        """
+        Vectorized compute_box_3d over every object.
+        Returns:
+            corners: (M, 8, 3) array of box corners
+        """
+        obj = self.objects
+        dims = np.stack([obj['l'], obj['h'], obj['w']], axis=1)        # (M, 3)
+        corners = _UNIT_CORNERS[None, :, :] * dims[:, None, :]          # (M, 8, 3)
+
+        cos, sin = np.cos(obj['ry']), np.sin(obj['ry'])
+        R = np.zeros((len(obj), 3, 3))
+        R[:, 0, 0], R[:, 0, 2] = cos, sin
+        R[:, 1, 1] = 1
+        R[:, 2, 0], R[:, 2, 2] = -sin, cos
+
+        corners = corners @ R.transpose(0, 2, 1)
+        corners += np.stack([obj['x'], obj['y'], obj['z']], axis=1)[:, None, :]
+        return corners
 
     def get_3d_boxes(self):
-        boxes = []
-        for label in self.labels:
-            box = self.compute_box_3d(label)
-            boxes.append(box)
-        return boxes
+        return list(self.compute_boxes_3d())
     
     def compute_box_3d(self, label):
         h, w, l = label['h'], label['w'], label['l']
@@ -86,32 +149,56 @@ class KITTILabelHandler(KITTIHandlerBase):
                 color=color, linewidth=1.5
             )
             
+    def project_boxes(self, calib: KITTICalibration, R, cameras=None):
+        """
+        Applies rotation, rectification, and projection to every box corner at once.
+        Args:
+            R: (4, 4) extrinsic, or (K, 4, 4) stack for K poses
+            cameras: optional camera names (e.g. ('P2', 'P3')) to project into instead of P2,
+                     adding a camera axis after the pose axis
+        Returns:
+            pts_h: ([K,] [C,] M, 8, 3) homogeneous image points
+            img_pts: ([K,] [C,] M, 8, 2) normalized image points
+        """
+        cam_to_rect = calib.R0_rect @ np.asarray(R)
+        if cameras is None:
+            proj = calib.P2 @ cam_to_rect                               # (3, 4) or (K, 3, 4)
+        else:
+            proj = calib.get_camera_matrices(cameras) @ cam_to_rect[..., None, :, :]   # ([K,] C, 3, 4)
+        corners = self.compute_boxes_3d()                               # (M, 8, 3)
+        pts_h = np.einsum('...ij,mcj->...mci', proj[..., :3], corners)
+        pts_h += proj[..., None, None, :, 3]
+        img_pts = pts_h[..., :2] / pts_h[..., 2:3]
+        return pts_h, img_pts
+
+    @timed("labels.project")
+    def get_2d_rects(self, calib: KITTICalibration, R, cameras=None, with_depth=False):
+        """
+        Projected 2D rects for all boxes, for one pose or a (K, 4, 4) stack of poses,
+        and optionally for several cameras (see project_boxes).
+        Returns:
+            rects: (..., M, 4) array of (xmin, ymin, xmax, ymax)
+            behind: (..., M) mask of boxes wholly behind the camera
+            near: with with_depth, (..., M) depth of each box's nearest corner, 0 if any is behind
+        """
+        pts_h, img_pts = self.project_boxes(calib, R, cameras)
+        rects = np.concatenate((img_pts.min(axis=-2), img_pts.max(axis=-2)), axis=-1)
+        behind = np.all(pts_h[..., 2] <= 0, axis=-1)
+        if with_depth:
+            return rects, behind, np.maximum(pts_h[..., 2].min(axis=-1), 0)
+        return rects, behind
+
     def get_3d_boxes_rotated(self, calib: KITTICalibration, R):
-        boxes = self.get_3d_boxes()
-        projected_boxes = []
-        
-        for corners_3d in boxes:
-            _, img_pts = self._project_box_to_image(corners_3d, R, calib)
-            projected_boxes.append(img_pts)
-            
-        return projected_boxes
+        _, img_pts = self.project_boxes(calib, R)
+        return list(img_pts)
 
+    @timed("labels.rotated")
     def get_2d_boxes_rotated(self, calib: KITTICalibration, R):
         """
         For each label, rotate its 3D box by (yaw,pitch), project, and return
         a list of (xmin, ymin, xmax, ymax), skipping any box wholly behind the camera.
         """
-        rects = []
-        objects_type = []
-        for lbl in self.labels:
-            obj_type = lbl.get("type")
-            corners = self.compute_box_3d(lbl)                  # (8,3)
-            pts_h, pts_2d = self._project_box_to_image(corners, R, calib)
-            # skip if all behind
-            if np.all(pts_h[:,2] <= 0):
-                continue
-            x0, y0 = pts_2d[:,0].min(), pts_2d[:,1].min()
-            x1, y1 = pts_2d[:,0].max(), pts_2d[:,1].max()
-            rects.append((x0, y0, x1, y1))
-            objects_type.append(obj_type)
-        return objects_type, rects
\ No newline at end of file
+        rects, behind = self.get_2d_rects(calib, R)
+        keep = ~behind
+        objects_type = [obj_type for obj_type, k in zip(self.types, keep) if k]
+        return objects_type, [tuple(rect) for rect in rects[keep].tolist()]
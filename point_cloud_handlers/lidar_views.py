@@ -0,0 +1,201 @@
+import zipfile
+
+import numpy as np
+
+from point_cloud_handlers.calibration import KITTICalibration
+from point_cloud_handlers.labels_handler import KITTILabelHandler
+
+BEV_CHANNELS = ("occupancy", "height", "intensity", "density")
+RANGE_CHANNELS = ("range", "height", "intensity", "mask")
+
+# Storage dtype of every view channel: the masks are 0/1, height, intensity and density are
+# bounded and coarse enough for float16, range keeps float32 for centimetres at 100 m
+CHANNEL_DTYPES = {
+    "occupancy": np.uint8, "mask": np.uint8,
+    "height": np.float16, "intensity": np.float16, "density": np.float16,
+    "range": np.float32,
+}
+
+
+def save_view_file(path, grid, channels, compresslevel=1):
+    """
+    Writes a (C, H, W) view as a compressed .npz with one member per channel, each in its
+    CHANNEL_DTYPES dtype. The grids are mostly empty cells, which the fastest deflate level
+    already shrinks to a few percent; np.savez_compressed has no level and takes twice as long.
+    """
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as npz:
+        for name, channel in zip(channels, grid):
+            with npz.open(f"{name}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, channel.astype(CHANNEL_DTYPES[name]))
+
+
+def load_view(path) -> np.ndarray:
+    """Reads a save_view_file .npz back into a (C, H, W) float32 grid, channels in stored order."""
+    with np.load(path) as data:
+        return np.stack([data[name].astype(np.float32) for name in data.files])
+
+
+def transform_to_poses(lidar_points, calib: KITTICalibration, extrinsics) -> np.ndarray:
+    """
+    Moves a sweep into the camera frame of every pose, R @ Tr_velo_to_cam, the frame the
+    label boxes are posed in by KITTILabelHandler.project_boxes. One (3K, 3) x (3, N) GEMM.
+    Args:
+        lidar_points: (N, >=3) lidar array
+        extrinsics: (K, 4, 4) stack of get_camera_extrinsic matrices
+    Returns:
+        points: (K, 3, N) camera-frame x (right), y (down), z (forward)
+    """
+    xyz = lidar_points[:, :3]
+    velo_to_cam = (np.asarray(extrinsics) @ calib.Tr_velo_to_cam).astype(xyz.dtype)
+    K = len(velo_to_cam)
+    points = (velo_to_cam[:, :3, :3].reshape(K * 3, 3) @ xyz.T).reshape(K, 3, -1)
+    points += velo_to_cam[:, :3, 3:]
+    return points
+
+
+class BEVGrid:
+    """
+    Bird's-eye-view raster of a posed camera frame: columns run along x (right), rows along
+    z (forward, farthest at row 0), heights are measured upwards from the camera (-y).
+    Every channel is one scatter reduction over the grid cells:
+        occupancy   1 where any point falls
+        height      highest point above height_range[0]
+        intensity   highest reflectance
+        density     min(1, log(1 + count) / log(density_norm))
+    """
+    channels = BEV_CHANNELS
+
+    def __init__(self, x_range=(-40.0, 40.0), z_range=(0.0, 70.4), height_range=(-2.5, 1.5),
+                 resolution=0.1, density_norm=64):
+        self.x_range = x_range
+        self.z_range = z_range
+        self.height_range = height_range
+        self.resolution = resolution
+        self.density_norm = density_norm
+        self.width = int(round((x_range[1] - x_range[0]) / resolution))
+        self.height = int(round((z_range[1] - z_range[0]) / resolution))
+
+    @property
+    def shape(self) -> tuple:
+        return self.height, self.width
+
+    def to_pixels(self, x, z):
+        """Continuous (col, row) grid coordinates of camera-frame x, z."""
+        return (x - self.x_range[0]) / self.resolution, (self.z_range[1] - z) / self.resolution
+
+    def rasterize(self, points, intensity) -> np.ndarray:
+        """
+        Args:
+            points: (3, N) camera-frame points, one pose of transform_to_poses
+            intensity: (N,) reflectance
+        Returns:
+            grid: (4, H, W) float32, channels in BEV_CHANNELS order
+        """
+        H, W = self.shape
+        h_min, h_max = self.height_range
+        x, y, z = points
+        height = -y
+        col, row = self.to_pixels(x, z)
+        keep = (col >= 0) & (col < W) & (row >= 0) & (row < H) & (height >= h_min) & (height < h_max)
+        cell = row[keep].astype(np.intp) * W + col[keep].astype(np.intp)
+
+        count = np.bincount(cell, minlength=H * W)
+        grid = np.zeros((4, H * W), dtype=np.float32)
+        grid[0] = count > 0
+        np.maximum.at(grid[1], cell, height[keep] - h_min)
+        np.maximum.at(grid[2], cell, intensity[keep])
+        grid[3] = np.minimum(1.0, np.log1p(count) / np.log(self.density_norm))
+        return grid.reshape(4, H, W)
+
+    def rasterize_multi(self, lidar_points, calib: KITTICalibration, extrinsics) -> np.ndarray:
+        """
+        Returns:
+            grids: (K, 4, H, W) float32, one grid per pose
+        """
+        intensity = lidar_points[:, 3]
+        return np.stack([self.rasterize(points, intensity)
+                         for points in transform_to_poses(lidar_points, calib, extrinsics)])
+
+    def boxes(self, label_handler: KITTILabelHandler, R):
+        """
+        Footprints of the label boxes posed by extrinsic R, in grid coordinates.
+        Returns:
+            corners: (M, 4, 2) (col, row) of the bottom face corners, in box order
+            inside: (M,) mask of the boxes whose centre falls inside the grid
+        """
+        R = np.asarray(R)
+        bottom = label_handler.compute_boxes_3d()[:, :4]                     # (M, 4, 3)
+        posed = bottom @ R[:3, :3].T + R[:3, 3]
+        corners = np.stack(self.to_pixels(posed[..., 0], posed[..., 2]), axis=-1)
+        center = corners.mean(axis=1)
+        inside = (center[:, 0] >= 0) & (center[:, 0] < self.width) & (center[:, 1] >= 0) & (center[:, 1] < self.height)
+        return corners, inside
+
+
+class RangeImage:
+    """
+    Spherical projection of a posed camera frame. Columns span the full azimuth with straight
+    ahead (+z) in the middle and +x to the right; rows span [fov_down, fov_up] degrees of
+    elevation, top row up. The nearest point of every pixel wins:
+        range       distance from the camera
+        height      -y of that point
+        intensity   its reflectance
+        mask        1 where any point falls
+    """
+    channels = RANGE_CHANNELS
+
+    def __init__(self, height=64, width=1024, fov_up=3.0, fov_down=-25.0):
+        self.height = height
+        self.width = width
+        self.fov_up = np.radians(fov_up)
+        self.fov_down = np.radians(fov_down)
+
+    @property
+    def shape(self) -> tuple:
+        return self.height, self.width
+
+    def rasterize(self, points, intensity) -> np.ndarray:
+        """
+        Args:
+            points: (3, N) camera-frame points, one pose of transform_to_poses
+            intensity: (N,) reflectance
+        Returns:
+            image: (4, H, W) float32, channels in RANGE_CHANNELS order
+        """
+        H, W = self.shape
+        x, y, z = points
+        flat = np.hypot(x, z)
+        distance = np.hypot(flat, y)
+        azimuth = np.arctan2(x, z)
+        elevation = np.arctan2(-y, flat)
+
+        col = ((azimuth + np.pi) / (2 * np.pi) * W).astype(np.intp) % W
+        row = (self.fov_up - elevation) / (self.fov_up - self.fov_down) * H
+        keep = (row >= 0) & (row < H) & (distance > 0)
+        cell = row[keep].astype(np.intp) * W + col[keep]
+        distance = distance[keep]
+
+        # Sort by (cell, distance) and keep the first, nearest, point of each cell. The distance
+        # rides in the fraction of a float64 key, one argsort is much cheaper than a lexsort.
+        order = np.argsort(cell + distance / (2.0 * distance.max()) if len(cell) else cell)
+        cell = cell[order]
+        first = np.ones(len(cell), dtype=bool)
+        first[1:] = cell[1:] != cell[:-1]
+        nearest = np.flatnonzero(keep)[order[first]]
+        cell = cell[first]
+
+        image = np.zeros((4, H * W), dtype=np.float32)
+        image[0, cell] = distance[order[first]]
+        image[1, cell] = -y[nearest]
+        image[2, cell] = intensity[nearest]
+        image[3, cell] = 1
+        return image.reshape(4, H, W)
+
+    def rasterize_multi(self, lidar_points, calib: KITTICalibration, extrinsics) -> np.ndarray:
+        """
+        Returns:
+            images: (K, 4, H, W) float32, one range image per pose
+        """
+        intensity = lidar_points[:, 3]
+        return np.stack([self.rasterize(points, intensity)
+                         for points in transform_to_poses(lidar_points, calib, extrinsics)])
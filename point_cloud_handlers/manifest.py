@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_digest(path, block_size=1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return {"array": _digest(np.ascontiguousarray(value).tobytes()), "dtype": value.dtype.str, "shape": value.shape}
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "__dict__"):
+        return {"type": type(value).__name__, **vars(value)}
+    return str(value)
+
+
+def params_digest(pose, settings) -> str:
+    """Digest of one pose's (yaw, pitch, roll, tx, ty, tz) and of every setting that shapes its outputs."""
+    text = json.dumps({"pose": [float(v) for v in pose], "settings": settings}, sort_keys=True, default=_jsonable)
+    return _digest(text.encode())
+
+
+class Manifest:
+    """
+    Records, for every (pose directory, frame) output, the digest of the frame's input files and
+    of the pose parameters it was generated with, in <output_dir>/manifest.json.
+
+    Input digests are content hashes (blake2b). They are cached with each file's size and mtime,
+    so unchanged inputs are only hashed on the first run.
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.inputs = {}        # path -> [size, mtime_ns, digest]
+        self.outputs = {}       # pose dir -> {frame: [input digest, params digest]}
+        if self.path.exists():
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.inputs = data["inputs"]
+                self.outputs = data["outputs"]
+
+    def _cached_file_digest(self, path):
+        path = str(path)
+        stat = os.stat(path)
+        cached = self.inputs.get(path)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = file_digest(path)
+        self.inputs[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def input_digest(self, source, file) -> str:
+        """
+        Combined digest of a frame's calib, label and velodyne inputs. Sources reading raw files
+        expose input_paths(file); packed sources hash their frame records through frame_digest(file).
+        """
+        if hasattr(source, "input_paths"):
+            return _digest("".join(self._cached_file_digest(path) for path in source.input_paths(file)).encode())
+        return source.frame_digest(file)
+
+    def stale_reason(self, pose_dir, file, input_digest, params_digest):
+        """None if the recorded output is current, else "new", "inputs" or "params"."""
+        entry = self.outputs.get(pose_dir, {}).get(file)
+        if entry is None:
+            return "new"
+        if entry[0] != input_digest:
+            return "inputs"
+        if entry[1] != params_digest:
+            return "params"
+        return None
+
+    def record(self, pose_dir, file, input_digest, params_digest):
+        self.outputs.setdefault(pose_dir, {})[file] = [input_digest, params_digest]
+
+    def save(self):
+        tmp = self.path.with_suffix(".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"version": self.VERSION, "inputs": self.inputs, "outputs": self.outputs}, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0     # seconds spent doing the stage's work
+        self.wait = 0.0     # seconds spent blocked on the neighbouring stages
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, wait=0.0, items=1):
+        with self._lock:
+            self.items += items
+            self.busy += busy
+            self.wait += wait
+
+    def as_dict(self):
+        return {"items": self.items, "busy_s": self.busy, "wait_s": self.wait}
+
+
+class StreamingPipeline:
+    """
+    Three-stage read -> compute -> write pipeline.
+
+    read_fn(item) runs in a thread pool that prefetches up to `prefetch` items ahead.
+    compute_fn(item, data) runs on the calling thread, in input order, and returns an
+    iterable of zero-argument write jobs, run by a second thread pool. Both hand-offs go
+    through bounded queues, so a slow stage blocks the ones feeding it instead of
+    buffering without limit.
+    """
+    def __init__(self, read_fn, compute_fn, read_workers=4, write_workers=4, prefetch=8, write_queue_size=32):
+        self.read_fn = read_fn
+        self.compute_fn = compute_fn
+        self.read_workers = read_workers
+        self.write_workers = write_workers
+        self.prefetch = prefetch
+        self.write_queue_size = write_queue_size
+        self.stats = {name: StageStats(name) for name in ("read", "compute", "write")}
+
+    def _timed_read(self, item):
+        start = time.perf_counter()
+        data = self.read_fn(item)
+        self.stats["read"].add(busy=time.perf_counter() - start)
+        return data
+
+    def _feed(self, items, read_pool, read_q, stop):
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                future = read_pool.submit(self._timed_read, item)
+                start = time.perf_counter()
+                read_q.put((item, future))
+                self.stats["read"].add(wait=time.perf_counter() - start, items=0)
+        finally:
+            read_q.put(_DONE)
+
+    def _write_loop(self, write_q, errors):
+        while True:
+            start = time.perf_counter()
+            job = write_q.get()
+            waited = time.perf_counter() - start
+            if job is _DONE:
+                self.stats["write"].add(wait=waited, items=0)
+                return
+            start = time.perf_counter()
+            try:
+                if not errors:
+                    job()
+            except BaseException as e:
+                errors.append(e)
+            self.stats["write"].add(busy=time.perf_counter() - start, wait=waited)
+
+    def run(self, items, on_item=None):
+        """
+        Streams every item through the three stages. on_item(item) is called after each compute step.
+        Returns the number of items computed.
+        """
+        read_q = queue.Queue(maxsize=self.prefetch)
+        write_q = queue.Queue(maxsize=self.write_queue_size)
+        stop = threading.Event()
+        errors = []
+
+        writers = [
+            threading.Thread(target=self._write_loop, args=(write_q, errors), daemon=True)
+            for _ in range(self.write_workers)
+        ]
+        for writer in writers:
+            writer.start()
+
+        count = 0
+        with ThreadPoolExecutor(self.read_workers) as read_pool:
+            feeder = threading.Thread(target=self._feed, args=(items, read_pool, read_q, stop), daemon=True)
+            feeder.start()
+            try:
+                while True:
+                    start = time.perf_counter()
+                    entry = read_q.get()
+                    if entry is _DONE:
+                        break
+                    item, future = entry
+                    data = future.result()
+                    waited = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    jobs = list(self.compute_fn(item, data))
+                    computed = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    for job in jobs:
+                        write_q.put(job)
+                    waited += time.perf_counter() - start
+                    self.stats["compute"].add(busy=computed, wait=waited)
+
+                    count += 1
+                    if on_item is not None:
+                        on_item(item)
+                    if errors:
+                        break
+            finally:
+                stop.set()
+                # Drain so a blocked feeder can finish
+                while feeder.is_alive():
+                    try:
+                        read_q.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                for _ in writers:
+                    write_q.put(_DONE)
+                for writer in writers:
+                    writer.join()
+
+        if errors:
+            raise errors[0]
+        return count
+
+    def report(self):
+        lines = [f"{'stage':<10}{'items':>8}{'busy [s]':>12}{'wait [s]':>12}{'ms/item':>10}"]
+        for stage in self.stats.values():
+            per_item = stage.busy / stage.items * 1e3 if stage.items else 0.0
+            lines.append(f"{stage.name:<10}{stage.items:>8}{stage.busy:>12.2f}{stage.wait:>12.2f}{per_item:>10.2f}")
+        return "\n".join(lines)
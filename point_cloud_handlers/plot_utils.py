@@ -1,8 +1,10 @@
-from matplotlib.patches import Rectangle
 import numpy as np
 
 
 def draw_rect_on_plot(ax, objects_rect, linewidth=2, edgecolor='red', facecolor='none'):
+    # matplotlib is only imported by the plots themselves, never by the numeric code
+    from matplotlib.patches import Rectangle
+
     for x0, y0, x1, y1 in objects_rect:
         rect = Rectangle(
             (x0, y0), 
@@ -0,0 +1,82 @@
+import csv
+import itertools
+import json
+from pathlib import Path
+
+import numpy as np
+
+from point_cloud_handlers.base_kitti_handler import KITTIHandlerBase
+
+POSE_FIELDS = ("yaw", "pitch", "roll", "tx", "ty", "tz")
+
+
+class PoseTable:
+    """
+    K virtual camera poses as a (K, 6) array of (yaw, pitch, roll, tx, ty, tz), angles in degrees.
+    Iterating yields one tuple per pose, like the zipped lists it replaces, and the K x 4 x 4
+    extrinsics are built in one vectorized pass the first time they are needed, then kept
+    for the whole run (including in the worker processes the table is pickled into).
+    """
+    def __init__(self, poses):
+        self.poses = np.asarray(poses, dtype=np.float64).reshape(-1, len(POSE_FIELDS))
+        self._extrinsics = None
+
+    @classmethod
+    def from_lists(cls, yaw=(0,), pitch=(0,), roll=(0,), tx=(0,), ty=(0,), tz=(0,)):
+        """Pose i takes the i-th entry of every list, lists of length 1 are broadcast."""
+        return cls(np.stack(np.broadcast_arrays(yaw, pitch, roll, tx, ty, tz), axis=1))
+
+    @classmethod
+    def grid(cls, yaw=(0,), pitch=(0,), roll=(0,), tx=(0,), ty=(0,), tz=(0,)):
+        """Cartesian product of the per-axis values, yaw varying slowest."""
+        return cls(list(itertools.product(yaw, pitch, roll, tx, ty, tz)))
+
+    @classmethod
+    def random(cls, count, seed=0, yaw=(0, 0), pitch=(0, 0), roll=(0, 0), tx=(0, 0), ty=(0, 0), tz=(0, 0)):
+        """count poses drawn uniformly from the per-axis (low, high) ranges, reproducible through seed."""
+        rng = np.random.default_rng(seed)
+        ranges = np.array([yaw, pitch, roll, tx, ty, tz], dtype=np.float64)
+        return cls(rng.uniform(ranges[:, 0], ranges[:, 1], size=(count, len(POSE_FIELDS))))
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads a .json list of {"yaw": ..., "tx": ...} objects (missing fields are 0), or a
+        CSV with a header naming some of the POSE_FIELDS columns.
+        """
+        path = Path(path)
+        if path.suffix == ".json":
+            with open(path) as f:
+                rows = json.load(f)
+        else:
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f, skipinitialspace=True))
+        return cls([[float(row.get(field) or 0) for field in POSE_FIELDS] for row in rows])
+
+    def save(self, path):
+        """Writes the table as CSV, readable by from_file."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(POSE_FIELDS)
+            writer.writerows(self.poses.tolist())
+
+    def __len__(self):
+        return len(self.poses)
+
+    def __iter__(self):
+        return iter(map(tuple, self.poses.tolist()))
+
+    def __getitem__(self, i):
+        return tuple(self.poses[i].tolist())
+
+    def extrinsics(self) -> np.ndarray:
+        """Read-only (K, 4, 4) get_camera_extrinsic matrices of every pose."""
+        if self._extrinsics is None:
+            self._extrinsics = KITTIHandlerBase().get_camera_extrinsics(self.poses)
+            self._extrinsics.flags.writeable = False
+        return self._extrinsics
+
+
+def as_pose_table(poses) -> PoseTable:
+    """Accepts a PoseTable or any sequence of (yaw, pitch, roll, tx, ty, tz) tuples."""
+    return poses if isinstance(poses, PoseTable) else PoseTable(list(poses))
@@ -0,0 +1,150 @@
+import csv
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+
+_NULL = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler.events.append((self.name, self.start, end - self.start, os.getpid(), threading.get_ident()))
+        return False
+
+
+class Profiler:
+    """
+    Opt-in stage timers and counters. Disabled, stage() returns a shared no-op context
+    and count() returns right away, so instrumented code pays one attribute check.
+
+    Events are (stage, start, duration, pid, thread id) tuples; list.append is atomic,
+    so pipeline threads record without a lock. Stages nest (e.g. "load" contains
+    "load.calib"), their times overlap rather than add up.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.events = []
+        self.counters = {}
+
+    def stage(self, name):
+        return _Timer(self, name) if self.enabled else _NULL
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self, reset=True):
+        """Recorded events and counters, e.g. to send from a worker process to the parent."""
+        data = {"events": self.events, "counters": self.counters}
+        if reset:
+            self.reset()
+        return data
+
+    def merge(self, snapshot):
+        self.events.extend(snapshot["events"])
+        with self._lock:
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """
+        Per-stage statistics.
+
+        Returns:
+            dict: {stage: {count, total_s, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}
+        """
+        durations = {}
+        for name, _, duration, _, _ in self.events:
+            durations.setdefault(name, []).append(duration)
+        stats = {}
+        for name in sorted(durations):
+            d = np.array(durations[name]) * 1e3
+            p50, p90, p99 = np.percentile(d, [50, 90, 99])
+            stats[name] = {
+                "count": len(d), "total_s": d.sum() / 1e3, "mean_ms": d.mean(),
+                "p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "max_ms": d.max(),
+            }
+        return stats
+
+    def report(self):
+        lines = [f"{'stage':<18}{'count':>8}{'total [s]':>11}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  [ms]"]
+        for name, s in self.summary().items():
+            lines.append(
+                f"{name:<18}{s['count']:>8}{s['total_s']:>11.2f}{s['mean_ms']:>9.2f}{s['p50_ms']:>9.2f}"
+                f"{s['p90_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+        for name, value in sorted(self.counters.items()):
+            if name.startswith("bytes_"):
+                lines.append(f"{name:<18}{value / 2 ** 20:>19.1f} MiB")
+            else:
+                lines.append(f"{name:<18}{value:>19}")
+        return "\n".join(lines)
+
+    def save(self, path):
+        """
+        Writes the trace. A .csv path gets one row per event, anything else a JSON
+        document with the summary, the counters and every event.
+        """
+        path = Path(path)
+        t0 = min((start for _, start, _, _, _ in self.events), default=0.0)
+        if path.suffix == ".csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["stage", "start_s", "duration_ms", "pid", "thread"])
+                for name, start, duration, pid, thread in self.events:
+                    writer.writerow([name, f"{start - t0:.6f}", f"{duration * 1e3:.4f}", pid, thread])
+        else:
+            with open(path, "w") as f:
+                json.dump({
+                    "summary": self.summary(),
+                    "counters": self.counters,
+                    "events": [
+                        {"stage": name, "start_s": start - t0, "duration_ms": duration * 1e3, "pid": pid, "thread": thread}
+                        for name, start, duration, pid, thread in self.events
+                    ],
+                }, f, indent=1)
+
+
+profiler = Profiler()
+
+
+def timed(name):
+    """Decorator recording every call of the function as stage `name` while profiling is enabled."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            with _Timer(profiler, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+# matplotlib's 'jet' segment data, so the default look needs no matplotlib import
+_JET_SEGMENTS = {
+    0: ((0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0), (1.0, 0.5)),
+    1: ((0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0), (0.91, 0.0), (1.0, 0.0)),
+    2: ((0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0), (1.0, 0.0)),
+}
+
+
+def jet_lut() -> np.ndarray:
+    """
+    Returns the (256, 3) uint8 RGB lookup table of matplotlib's 'jet' colormap.
+    """
+    x = np.linspace(0.0, 1.0, 256)
+    lut = np.empty((256, 3), dtype=np.uint8)
+    for channel, segments in _JET_SEGMENTS.items():
+        xp, fp = zip(*segments)
+        lut[:, channel] = np.round(np.interp(x, xp, fp) * 255)
+    return lut
+
+
+def get_colormap_lut(name: str = "jet") -> np.ndarray:
+    """
+    Returns a (256, 3) uint8 RGB lookup table for a named colormap.
+    Anything other than 'jet' is sampled from matplotlib.
+    """
+    if name == "jet":
+        return jet_lut()
+    from matplotlib import colormaps
+    rgba = colormaps[name](np.linspace(0.0, 1.0, 256))
+    return np.round(rgba[:, :3] * 255).astype(np.uint8)
+
+
+def _disc_offsets(radius: int) -> np.ndarray:
+    r = int(radius)
+    dv, du = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = du ** 2 + dv ** 2 <= r ** 2
+    return np.stack([du[inside], dv[inside]], axis=1)
+
+
+def rasterize_points(img_pts, depth, image_shape: tuple, radius: int = 0, lut=None,
+                     alpha: float = 0.3, z_buffer: bool = True) -> np.ndarray:
+    """
+    Draws depth-colored points straight into an (H, W, 3) uint8 RGB buffer on black.
+    Args:
+        img_pts: (N, 2) projected image points
+        depth: (N,) depth per point, colored min -> max through the LUT
+        image_shape: (H, W, C) or (H, W) of the output, usually the source image shape
+        radius: point radius in pixels, 0 draws single pixels
+        lut: (256, 3) uint8 RGB colormap, defaults to jet
+        alpha: per-point opacity; n points on one pixel reach 1 - (1 - alpha)^n,
+               like matplotlib stacking semi-transparent markers
+        z_buffer: the nearest point colors each pixel, otherwise the last drawn one does
+    Returns:
+        canvas: (H, W, 3) uint8 RGB image
+    """
+    H, W = image_shape[:2]
+    lut = jet_lut() if lut is None else lut
+    canvas = np.zeros((H * W, 3), dtype=np.uint8)
+
+    mask = (
+        (depth > 0) &
+        (img_pts[:, 0] >= 0) & (img_pts[:, 1] >= 0) &
+        (img_pts[:, 0] < W) & (img_pts[:, 1] < H)
+    )
+    if not mask.any():
+        return canvas.reshape(H, W, 3)
+    pts, dp = img_pts[mask], depth[mask]
+
+    # Same normalization as the matplotlib scatter: visible depth range -> LUT
+    d_min, d_max = dp.min(), dp.max()
+    scale = 255.0 / (d_max - d_min) if d_max > d_min else 0.0
+    color_idx = ((dp - d_min) * scale).astype(np.intp)
+
+    u = pts[:, 0].astype(np.intp)
+    v = pts[:, 1].astype(np.intp)
+    if radius > 0:
+        offsets = _disc_offsets(radius)
+        u = (u[None, :] + offsets[:, :1]).ravel()
+        v = (v[None, :] + offsets[:, 1:]).ravel()
+        dp = np.tile(dp, len(offsets))
+        color_idx = np.tile(color_idx, len(offsets))
+        inside = (u >= 0) & (v >= 0) & (u < W) & (v < H)
+        u, v, dp, color_idx = u[inside], v[inside], dp[inside], color_idx[inside]
+
+    pixel = v * W + u
+    if z_buffer:
+        order = np.lexsort((dp, pixel))                 # per pixel, nearest first
+    else:
+        order = np.arange(len(pixel))[::-1]             # per pixel, last drawn first
+        order = order[np.argsort(pixel[order], kind="stable")]
+    pixel = pixel[order]
+
+    starts = np.flatnonzero(np.r_[True, pixel[1:] != pixel[:-1]])
+    counts = np.diff(np.r_[starts, len(pixel)])
+    winners = order[starts]
+
+    opacity = 1.0 - (1.0 - alpha) ** counts
+    colors = lut[color_idx[winners]] * opacity[:, None]
+    canvas[pixel[starts]] = np.round(colors).astype(np.uint8)
+    return canvas.reshape(H, W, 3)
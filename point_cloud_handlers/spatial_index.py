@@ -0,0 +1,81 @@
+import numpy as np
+
+from point_cloud_handlers.calibration import KITTICalibration
+
+
+class AzimuthIndex:
+    """
+    Sorts a velodyne sweep into az_bins azimuth sectors of the camera frame (Tr_velo_to_cam,
+    the frame the pose extrinsic rotates) and keeps a contiguous (3, N) copy of the sorted
+    points. Built once per frame, it answers "which points can a rotated camera see" with the
+    one or two contiguous slices of sectors its field of view spans (two when it wraps around
+    the back), which project_visible_multi projects as they are, without gathering.
+
+    A camera's field of view is about a quarter of the sweep's azimuth but most of its
+    elevation range, so only the azimuth is indexed.
+    """
+    def __init__(self, lidar_points, calib: KITTICalibration, az_bins=360):
+        self.az_bins = az_bins
+        self.num_points = len(lidar_points)
+
+        xyz = lidar_points[:, :3]
+        Tr = calib.Tr_velo_to_cam.astype(xyz.dtype)
+        # Only the camera x (right) and z (forward) axes decide the azimuth
+        cam_xz = xyz @ Tr[[0, 2], :3].T + Tr[[0, 2], 3]
+        bins = self._az_bin(np.arctan2(cam_xz[:, 0], cam_xz[:, 1]))
+        # Small integer keys let the stable argsort use radix sort
+        key_dtype = np.uint16 if az_bins <= np.iinfo(np.uint16).max else np.intp
+        bins = bins.astype(key_dtype)
+
+        self.order = np.argsort(bins, kind="stable")
+        self.points = np.ascontiguousarray(xyz[self.order].T)                 # (3, N), sorted
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(bins, minlength=az_bins))))
+
+    def _az_bin(self, azimuth):
+        return (((azimuth + np.pi) / (2 * np.pi) * self.az_bins).astype(np.intp)) % self.az_bins
+
+    def _view_rays(self, calib: KITTICalibration, extrinsics, image_shape, samples=16):
+        """(K, M, 3) directions of the image border pixels of every pose, in the index's camera frame."""
+        H, W = image_shape[:2]
+        t = np.linspace(0.0, 1.0, samples)
+        border = np.concatenate([
+            np.stack([t * W, np.zeros_like(t)], 1), np.stack([t * W, np.full_like(t, H)], 1),
+            np.stack([np.zeros_like(t), t * H], 1), np.stack([np.full_like(t, W), t * H], 1),
+            [[W / 2, H / 2]],
+        ])
+        pixels = np.hstack((border, np.ones((len(border), 1))))
+        rays_rect = pixels @ np.linalg.inv(calib.P2[:, :3]).T
+        # rect = R0_rect @ R @ cam, so cam directions = (R0_rect @ R)^-1 rect directions
+        rect_to_cam = np.linalg.inv((calib.R0_rect @ extrinsics)[:, :3, :3])
+        return rays_rect @ rect_to_cam.transpose(0, 2, 1)
+
+    def query(self, calib: KITTICalibration, extrinsics, image_shape, margin_deg=2.0):
+        """
+        For every extrinsic of a (K, 4, 4) stack, the (start, stop) slices of self.points (and
+        self.order) holding the sectors that cover its field of view: a superset of its visible
+        points, to be culled exactly afterwards.
+        None instead for poses with a translation, whose sectors are not centred on the sweep
+        origin, and for frusta containing a pole, which have to scan the whole cloud.
+        """
+        extrinsics = np.asarray(extrinsics)
+        rays = self._view_rays(calib, extrinsics, image_shape)
+        margin = np.radians(margin_deg)
+        elevation = np.arctan2(-rays[..., 1], np.hypot(rays[..., 0], rays[..., 2]))
+        indexable = (np.abs(elevation).max(axis=1) + margin < np.pi / 2) & ~extrinsics[:, :3, 3].any(axis=1)
+
+        azimuth = np.arctan2(rays[..., 0], rays[..., 2])
+        center = azimuth[:, -1:]
+        delta = (azimuth - center + np.pi) % (2 * np.pi) - np.pi
+        first = self._az_bin(center[:, 0] + delta.min(axis=1) - margin)
+        count = (self._az_bin(center[:, 0] + delta.max(axis=1) + margin) - first) % self.az_bins + 1
+        stop = first + count
+
+        spans = []
+        for ok, a, b in zip(indexable, first.tolist(), stop.tolist()):
+            if not ok:
+                spans.append(None)
+            elif b <= self.az_bins:
+                spans.append([(self.offsets[a], self.offsets[b])])
+            else:
+                spans.append([(self.offsets[a], self.num_points), (0, self.offsets[b - self.az_bins])])
+        return spans
@@ -0,0 +1,203 @@
+import numpy as np
+
+from point_cloud_handlers.buffers import buffer_pool
+from point_cloud_handlers.calibration import KITTICalibration
+from point_cloud_handlers.profiling import timed
+
+
+def clip_rects(rects, image_shape, min_size=1.0):
+    """
+    Clips 2D rects to the image.
+    Args:
+        rects: (..., M, 4) array of (xmin, ymin, xmax, ymax)
+        min_size: rects narrower or shorter than this many pixels once clipped are off-screen
+    Returns:
+        clipped: (..., M, 4) clipped rects
+        onscreen: (..., M) mask of the rects still covering the image
+    """
+    H, W = image_shape[:2]
+    clipped = np.clip(rects, 0, [W, H, W, H])
+    size = clipped[..., 2:] - clipped[..., :2]
+    return clipped, np.all(size >= min_size, axis=-1)
+
+
+def points_in_boxes(lidar_points, calib: KITTICalibration, objects, ground_margin=0.1, grid_cell=2.0,
+                    chunk_size=32768):
+    """
+    Batched point-in-box test of a velodyne sweep against every labelled 3D box.
+    Points are moved into the frame the boxes live in (Tr_velo_to_cam, before any pose). A coarse
+    grid_cell sized occupancy grid of the boxes' footprints on the ground plane first narrows the
+    sweep down to the few points near a box, which then go into every box's own frame with one
+    (n, 3) x (3, 3M) GEMM per chunk.
+    Points within ground_margin of a box's bottom face are left out, they are the road it stands on.
+    Args:
+        objects: LABEL_DTYPE array
+    Returns:
+        box_ids: (N,) index of the box containing each point, -1 for none (first box on overlaps)
+    """
+    xyz = lidar_points[:, :3]
+    N, M = len(xyz), len(objects)
+    box_ids = np.full(N, -1, dtype=np.int32)
+    if not M:
+        return box_ids
+
+    Tr = calib.Tr_velo_to_cam
+    center = np.stack([objects['x'], objects['y'], objects['z']], axis=1)
+
+    # Candidates: points whose ground-plane cell touches a box's bounding circle
+    radius = np.hypot(objects['l'], objects['w']) / 2
+    origin = (center[:, [0, 2]] - radius[:, None]).min(axis=0)
+    lo = np.floor((center[:, [0, 2]] - radius[:, None] - origin) / grid_cell).astype(np.intp)
+    hi = np.floor((center[:, [0, 2]] + radius[:, None] - origin) / grid_cell).astype(np.intp)
+    # One empty cell of padding on every side takes the points clipped off the grid
+    grid = np.zeros(hi.max(axis=0) + 3, dtype=bool)
+    for (x0, z0), (x1, z1) in zip(lo + 1, hi + 1):
+        grid[x0:x1 + 1, z0:z1 + 1] = True
+    ground = (Tr[[0, 2]] / grid_cell).astype(xyz.dtype)
+    ground[:, 3] -= (origin / grid_cell - 1).astype(xyz.dtype)
+    cells = xyz @ ground[:, :3].T + ground[:, 3]
+    np.clip(cells, 0, np.array(grid.shape, dtype=xyz.dtype) - 1, out=cells)
+    cells = cells.astype(np.intp)
+    candidates = np.flatnonzero(grid[cells[:, 0], cells[:, 1]])
+
+    # p_box = Ry(ry)^T (Tr p - c), rows ordered (box, axis)
+    cos, sin = np.cos(objects['ry']), np.sin(objects['ry'])
+    zeros, ones = np.zeros(M), np.ones(M)
+    Ry_t = np.stack([
+        np.stack([cos, zeros, -sin], axis=1),
+        np.stack([zeros, ones, zeros], axis=1),
+        np.stack([sin, zeros, cos], axis=1),
+    ], axis=1)                                                          # (M, 3, 3)
+    linear = (Ry_t @ Tr[:3, :3]).reshape(3 * M, 3)
+    offset = np.einsum('mij,mj->mi', Ry_t, Tr[:3, 3] - center).reshape(3 * M)
+    half_l, half_w = objects['l'] / 2, objects['w'] / 2
+    lower = np.stack([-half_l, -objects['h'], -half_w], axis=1).reshape(3 * M) - offset
+    upper = np.stack([half_l, zeros - ground_margin, half_w], axis=1).reshape(3 * M) - offset
+    linear, lower, upper = (a.astype(xyz.dtype) for a in (linear, lower, upper))
+
+    for start in range(0, len(candidates), chunk_size):
+        rows = candidates[start:start + chunk_size]
+        local = buffer_pool.get("boxes", (len(rows), 3 * M), xyz.dtype)
+        np.matmul(xyz[rows], linear.T, out=local)
+        ok = (local >= lower) & (local <= upper)
+        inside = ok[:, 0::3] & ok[:, 1::3] & ok[:, 2::3]                   # (n, M)
+        hit = np.flatnonzero(inside.any(axis=1))
+        box_ids[rows[hit]] = inside[hit].argmax(axis=1)
+    return box_ids
+
+
+class VisibilityFilter:
+    """
+    Occlusion-aware box filtering for one frame seen from many poses.
+
+    Each box's lidar points are found once per frame (points_in_boxes). Per pose, the visible
+    points are binned into cell_size x cell_size pixel cells holding their nearest depth, a
+    coarse z-buffer of the same projection the images are rendered from, and every cell takes
+    the nearest depth within dilate cells around it so sparse occluders still cover what is
+    behind them. A cell a box covers is visible if that nearest point is the box's own, or one
+    of the box's points there is within depth_tolerance of it; the visible fraction of a box
+    is the share of its cells that are visible.
+    A box without a single lidar point in the image, typically one wholly hidden behind a
+    nearer object, is judged by the cells of its clipped rect instead: those holding a point
+    nearer than its nearest corner are occluded, the rest visible. It gets a NaN fraction only
+    if it is off-screen.
+    Boxes are clipped to the image, and kept if still on-screen and not less than min_visible
+    visible.
+    """
+    def __init__(self, min_visible=0.1, cell_size=4, dilate=1, depth_tolerance=0.3, ground_margin=0.1,
+                 min_size=1.0):
+        self.min_visible = min_visible
+        self.cell_size = cell_size
+        self.dilate = dilate
+        self.depth_tolerance = depth_tolerance
+        self.ground_margin = ground_margin
+        self.min_size = min_size
+
+    def box_ids(self, lidar_points, calib: KITTICalibration, objects):
+        """Per-point box index of the frame, shared by all its poses."""
+        return points_in_boxes(lidar_points, calib, objects, self.ground_margin)
+
+    def depth_buffer(self, image_points, depth, owner, image_shape):
+        """
+        Args:
+            owner: (V,) box index of every point, -1 for none
+        Returns:
+            zbuf: (rows, cols) nearest depth per cell after dilation, inf where empty
+            zowner: (rows, cols) box index of that nearest point, -1 for none
+            cells: (V,) flat cell index of every point
+        """
+        H, W = image_shape[:2]
+        rows, cols = -(-H // self.cell_size), -(-W // self.cell_size)
+        # Clipped, so points rounded onto the far image border still fall into the last cell
+        row = np.minimum(image_points[:, 1].astype(np.intp) // self.cell_size, rows - 1)
+        col = np.minimum(image_points[:, 0].astype(np.intp) // self.cell_size, cols - 1)
+        cells = row * cols + col
+        # Positive float32 bits sort like the depths, so one int64 min carries the nearest
+        # depth in the high word and its box in the low word
+        keys = depth.astype(np.float32).view(np.int32).astype(np.int64) << 32
+        keys |= owner + 1
+        empty = np.iinfo(np.int64).max
+        zkeys = np.full(rows * cols, empty, dtype=np.int64)
+        np.minimum.at(zkeys, cells, keys)
+        zkeys = zkeys.reshape(rows, cols)
+
+        d = self.dilate
+        if d:
+            padded = np.pad(zkeys, d, constant_values=empty)
+            for dy in range(2 * d + 1):
+                for dx in range(2 * d + 1):
+                    np.minimum(zkeys, padded[dy:dy + rows, dx:dx + cols], out=zkeys)
+        zbuf = (zkeys >> 32).astype(np.int32).view(np.float32)
+        zbuf[zkeys == empty] = np.inf
+        zowner = (zkeys & 0xFFFFFFFF).astype(np.int32) - 1
+        return zbuf, zowner, cells
+
+    def visible_fraction(self, box_ids, rects, near, image_points, depth, indices, image_shape):
+        """
+        Args:
+            box_ids: (N,) from box_ids
+            rects: (M, 4) clipped rects, near: (M,) nearest corner depths, see get_2d_rects
+            image_points, depth, indices: one pose's project_visible result
+        Returns:
+            fraction: (M,) visible cell fraction, NaN for off-screen boxes with no visible points
+        """
+        num_boxes = len(rects)
+        owner = box_ids[indices]
+        zbuf, zowner, cells = self.depth_buffer(image_points, depth, owner, image_shape)
+        in_box = np.flatnonzero(owner >= 0)
+        cells, owner = cells[in_box], owner[in_box]
+        # A box does not occlude itself, only nearer points of anything else do
+        visible = (zowner.ravel()[cells] == owner) | (depth[in_box] <= zbuf.ravel()[cells] + self.depth_tolerance)
+
+        # (cell, box) pairs, a pair is visible if any of its points is
+        pairs = cells * num_boxes + owner
+        covered = np.bincount(np.unique(pairs) % num_boxes, minlength=num_boxes)
+        seen = np.bincount(np.unique(pairs[visible]) % num_boxes, minlength=num_boxes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = seen / covered
+
+        # Boxes without points: the share of their rect's cells not covered by anything nearer
+        cell = self.cell_size
+        for m in np.flatnonzero(covered == 0):
+            x0, y0 = (rects[m, :2] // cell).astype(int)
+            x1, y1 = np.ceil(rects[m, 2:] / cell).astype(int)
+            cells = zbuf[y0:y1, x0:x1]
+            if cells.size:
+                fraction[m] = 1 - np.count_nonzero(cells + self.depth_tolerance < near[m]) / cells.size
+        return fraction
+
+    @timed("labels.visibility")
+    def filter(self, rects, behind, near, box_ids, visible, image_shape):
+        """
+        Args:
+            rects, behind, near: one pose's get_2d_rects(..., with_depth=True) result, (M, 4), (M,), (M,)
+            visible: one pose's (image_points, depth, indices) from project_visible
+        Returns:
+            rects: (M, 4) clipped rects
+            keep: (M,) mask of the boxes to label
+            fraction: (M,) visible fraction
+        """
+        rects, onscreen = clip_rects(rects, image_shape, self.min_size)
+        fraction = self.visible_fraction(box_ids, rects, near, *visible, image_shape)
+        keep = ~behind & onscreen & ~(fraction < self.min_visible)
+        return rects, keep, fraction
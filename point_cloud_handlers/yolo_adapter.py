@@ -1,6 +1,10 @@
 from pathlib import Path  
 from typing import Sequence
 
+import numpy as np
+
+from point_cloud_handlers.profiling import timed
+
 CLASS_NAME_TO_CLASS_ID = {
     "Car": 0, 
     "Pedestrian": 1,
@@ -12,6 +16,7 @@ CLASS_NAME_TO_CLASS_ID = {
 }
 
 
+@timed("labels.yolo")
 def rects_to_yolo(rects: list, image_shape: tuple, class_names: list):
     """
     Converts 2D bounding boxes to YOLO format.
@@ -42,7 +47,76 @@ def rects_to_yolo(rects: list, image_shape: tuple, class_names: list):
     return yolo_labels
 
 
+def rects_to_yolo_array(rects, image_shape: tuple, class_names: list):
+    """
+    Vectorized rects_to_yolo.
+
+    Args:
+        rects (array-like): (M, 4) boxes as (xmin, ymin, xmax, ymax)
+        image_shape (tuple): (H, W, C) or (H, W)
+        class_names (list of str): class name per rectangle (same length as rects)
+
+    Returns:
+        class_ids (np.ndarray): (M,) int class ids, 0 for unknown names
+        boxes (np.ndarray): (M, 4) normalized (x_center, y_center, width, height)
+    """
+    H, W = image_shape[:2]
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    scale = np.array([W, H], dtype=np.float64)
+    boxes = np.concatenate(((rects[:, :2] + rects[:, 2:]) / 2.0 / scale, (rects[:, 2:] - rects[:, :2]) / scale), axis=1)
+    names = list(class_names or ())[:len(rects)]
+    class_ids = np.zeros(len(rects), dtype=np.int64)
+    class_ids[:len(names)] = [CLASS_NAME_TO_CLASS_ID.get(name, 0) for name in names]
+    return class_ids, boxes
+
+
+def format_yolo_rows(class_ids, values, precision: int = 6) -> str:
+    """
+    Formats YOLO rows at a fixed precision in one string-formatting pass.
+
+    Args:
+        class_ids (array-like): (M,) int class ids
+        values (array-like): (M, C) floats per row, e.g. from rects_to_yolo_array
+        precision (int): digits after the decimal point
+
+    Returns:
+        text (str): M newline-terminated "class_id v1 ... vC" lines
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return ""
+    rows = np.empty((len(values), values.shape[1] + 1), dtype=object)
+    rows[:, 0] = np.asarray(class_ids).tolist()
+    rows[:, 1:] = values.tolist()
+    line = "%d" + f" %.{precision}f" * values.shape[1] + "\n"
+    return (line * len(rows)) % tuple(rows.ravel())
+
+
 def save_yolo_label(output: Path, yolo_lines: list[tuple]):
     with open(output, "w") as f:
         for line in yolo_lines:
-            f.write(" ".join(map(str, line)) + "\n")
\ No newline at end of file
+            f.write(" ".join(map(str, line)) + "\n")
+
+def corners_to_yolo_obb(corners, image_shape: tuple, class_names: list):
+    """
+    Converts rotated boxes to YOLO OBB format.
+
+    Args:
+        corners (array-like): (M, 4, 2) pixel (x, y) corners of each box, in drawing order
+        image_shape (tuple): (H, W, C) or (H, W) of the raster the corners live in
+        class_names (list of str): class name per box (same length as corners)
+
+    Returns:
+        yolo_labels (list of lists): each sublist is [class_id, x1, y1, x2, y2, x3, y3, x4, y4], normalized
+    """
+    H, W = image_shape[:2]
+    yolo_labels = []
+
+    for i, box in enumerate(corners):
+        class_id = CLASS_NAME_TO_CLASS_ID.get(class_names[i], 0) if class_names and i < len(class_names) else 0
+        coords = []
+        for x, y in box:
+            coords += [x / W, y / H]
+        yolo_labels.append([class_id, *coords])
+
+    return yolo_labels
@@ -6,7 +6,7 @@ with open("requirements.txt") as f:
 setup(
     name='point_cloud_handlers',
     version='0.1.1',
-    packages=find_packages(), 
+    packages=find_packages(exclude=["benchmarks"]),
     install_requires=requirements,    
     author='Gil Heller',
     description='point cloud trasnformations',